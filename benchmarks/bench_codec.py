@@ -0,0 +1,98 @@
+"""
+Size and speed benchmark for the Compressed JSON codec.
+
+    python benchmarks/bench_codec.py --applicants 200 --jobs 3 20 80
+
+Payloads are built by compress from the fake base in tests/fakes.py, with
+each work history padded to the requested number of jobs. For every format
+it reports the mean stored size and encode/decode time per payload.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'tests')]
+os.chdir(ROOT)
+for key, value in (('AIRTABLE_API_KEY', 'bench'), ('AIRTABLE_BASE_ID', 'appBench'), ('GEMINI_API_KEY', 'bench')):
+    os.environ.setdefault(key, value)
+
+import codec  # noqa: E402
+from compress import _assemble_payload, build_index  # noqa: E402
+from fakes import FakeAirtable, seed_applicants  # noqa: E402
+
+FORMATS = {
+    'v1 (indent=2)': (lambda p: json.dumps(p, indent=2, default=str), json.loads),
+    'v1 (compact)': (lambda p: json.dumps(p, default=str), json.loads),
+    'v2': (lambda p: codec.encode(p, pack=False), codec.decode),
+    'v2 packed': (lambda p: codec.encode(p, pack=True), codec.decode),
+}
+
+
+def build_payloads(applicants, jobs, seed=0):
+    rnd = random.Random(seed)
+    fake = FakeAirtable()
+    with fake.installed():
+        seed_applicants(fake, applicants, seed=seed)
+        index = build_index()
+    payloads = []
+    for aid, entry in index.items():
+        payload = _assemble_payload(aid, entry['personal'], entry['work'], entry['salary'])
+        history = payload['experience']
+        while len(history) < jobs:
+            job = dict(rnd.choice(history))
+            # the kind of sparse rows Airtable exports: long free text, blanks, nulls
+            job.update(Description=' '.join(rnd.choice(['built', 'owned', 'scaled', 'migrated', 'pipelines',
+                                                        'services', 'for', 'the', 'team', 'data'])
+                                            for _ in range(rnd.randint(10, 60))),
+                       Manager=None, Notes='', Tags=[])
+            history.append(job)
+        payloads.append(payload)
+    return payloads
+
+
+def bench(payloads, encode, decode):
+    started = time.perf_counter()
+    encoded = [encode(p) for p in payloads]
+    encode_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for text in encoded:
+        decode(text)
+    decode_s = time.perf_counter() - started
+    n = len(payloads)
+    return {
+        'mean_chars': sum(map(len, encoded)) / n,
+        'max_chars': max(map(len, encoded)),
+        'encode_us': encode_s * 1e6 / n,
+        'decode_us': decode_s * 1e6 / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--applicants', type=int, default=200)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[3, 20, 80], help='work history length per payload')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'jobs':>5}  {'format':<14} {'mean chars':>10} {'max chars':>10} {'vs v1':>6} {'enc us':>8} {'dec us':>8}")
+    for jobs in args.jobs:
+        payloads = build_payloads(args.applicants, jobs)
+        baseline = None
+        for name, (encode, decode) in FORMATS.items():
+            row = {'jobs': jobs, 'format': name, **bench(payloads, encode, decode)}
+            baseline = baseline or row['mean_chars']
+            results.append(row)
+            print(f"{jobs:>5}  {name:<14} {row['mean_chars']:>10.0f} {row['max_chars']:>10} "
+                  f"{row['mean_chars'] / baseline:>6.2f} {row['encode_us']:>8.1f} {row['decode_us']:>8.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Offline throughput benchmark for the pipeline stages against the fake
+Airtable base and fake Gemini model in tests/fakes.py.
+
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+
+For each base size it reports, per stage, Airtable requests per applicant,
+wall time and peak traced memory. Per-applicant stages that re-read whole
+tables are run on a sample (--sample) so large sizes stay tractable.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'tests')]
+os.chdir(ROOT)
+for key, value in (('AIRTABLE_API_KEY', 'bench'), ('AIRTABLE_BASE_ID', 'appBench'), ('GEMINI_API_KEY', 'bench')):
+    os.environ.setdefault(key, value)
+
+import llm  # noqa: E402
+from airtable_utils import write_buffer  # noqa: E402
+from compress import build_compressed_json, build_index  # noqa: E402
+from decompress import decompress_and_upsert, decompress_many  # noqa: E402
+from fakes import FakeAirtable, FakeGeminiModel, seed_applicants  # noqa: E402
+from llm_cache import ResultCache  # noqa: E402
+from llm_engine import evaluate_batch  # noqa: E402
+from run_pipeline import run_for_applicant  # noqa: E402
+from shortlist import evaluate_shortlist, shortlist_batch  # noqa: E402
+
+
+def measure(fake, name, applicants, fn):
+    fake.reset_counts()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'stage': name,
+        'applicants': applicants,
+        'requests_per_applicant': fake.requests / applicants if applicants else 0.0,
+        'wall_seconds': elapsed,
+        'ms_per_applicant': elapsed * 1000 / applicants if applicants else 0.0,
+        'peak_mb': peak / 2**20,
+    }
+
+
+def bench_size(size, sample, llm_sample, latency):
+    fake = FakeAirtable(latency=latency)
+    model = FakeGeminiModel()
+    llm.gemini_model = model
+    cache_dir = tempfile.mkdtemp(prefix='bench-cache-')
+    cache = ResultCache(os.path.join(cache_dir, 'results.sqlite3'))
+    llm.get_result_cache = lambda: cache
+    rows = []
+    with fake.installed():
+        ids = seed_applicants(fake, size)
+        few = ids[:sample]
+        rows.append(measure(fake, 'compress (per applicant)', len(few),
+                            lambda: [build_compressed_json(a) for a in few]))
+
+        index_holder = {}
+
+        def compress_batch():
+            index_holder['index'] = index = build_index()
+            with write_buffer(auto_flush=100):
+                index_holder['payloads'] = [build_compressed_json(a, index=index) for a in ids]
+        rows.append(measure(fake, 'compress (batch)', size, compress_batch))
+        index, payloads = index_holder['index'], index_holder['payloads']
+
+        rows.append(measure(fake, 'shortlist (per applicant)', len(few),
+                            lambda: [evaluate_shortlist(p) for p in payloads[:sample]]))
+
+        def shortlist_all():
+            with write_buffer(auto_flush=100):
+                shortlist_batch(payloads, index=index)
+        rows.append(measure(fake, 'shortlist (batch)', size, shortlist_all))
+
+        items = [(p['applicant_id'], json.dumps(p, default=str)) for p in payloads[:llm_sample]]
+        rows.append(measure(fake, 'llm (engine, cold cache)', len(items),
+                            lambda: evaluate_batch(items, requests_per_minute=10**9, concurrency=8)))
+
+        rows.append(measure(fake, 'decompress (per applicant)', len(few),
+                            lambda: [decompress_and_upsert(a) for a in few]))
+        rows.append(measure(fake, 'decompress (batch)', size, decompress_many))
+        rows.append(measure(fake, 'run_for_applicant', len(few),
+                            lambda: [run_for_applicant(a) for a in few]))
+    for row in rows:
+        row['base_size'] = size
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--sample', type=int, default=20, help='applicants for per-applicant stages')
+    parser.add_argument('--llm-sample', type=int, default=200, help='applicants sent to the fake LLM')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake Airtable seconds per request')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = []
+    print(f"{'size':>8}  {'stage':<28} {'n':>7} {'req/app':>8} {'wall s':>8} {'ms/app':>8} {'peak MB':>8}")
+    for size in args.sizes:
+        for row in bench_size(size, args.sample, args.llm_sample, args.latency):
+            results.append(row)
+            print(f"{size:>8}  {row['stage']:<28} {row['applicants']:>7} {row['requests_per_applicant']:>8.2f} "
+                  f"{row['wall_seconds']:>8.2f} {row['ms_per_applicant']:>8.2f} {row['peak_mb']:>8.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,2 @@
 #!/bin/bash
-python src/run_pipeline.py $1
+python src/run_pipeline.py "$@"
@@ -1,41 +1,469 @@
-import os
-import yaml
-from pyairtable import Table
-from dotenv import load_dotenv
-load_dotenv()
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import quote as url_quote
+import metrics
+import retries
+from config import load_config
 import logging
 logging.basicConfig(level=logging.INFO)
 
-# Load config.yaml and support environment interpolation
-def _load_config():
-    with open('config.yaml') as f:
-        raw = f.read()
-    # naive env substitution for ${VAR}
-    for k,v in os.environ.items():
-        raw = raw.replace('${' + k + '}', v)
-    return yaml.safe_load(raw)
+CONFIG = load_config()
 
-CONFIG = _load_config()
+# Airtable allows 5 requests per second per base
+DEFAULT_REQUESTS_PER_SECOND = 5
 
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available,
+    so any number of callers together stay at `rate` requests per second.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+LIMITER = TokenBucket(CONFIG['airtable'].get('requests_per_second') or DEFAULT_REQUESTS_PER_SECOND)
+# list URLs fail past ~16k characters; keep each URL-encoded OR(...) formula well under that
+MAX_FORMULA_URL_CHARS = CONFIG['airtable'].get('max_formula_chars') or 8000
+
+@lru_cache(maxsize=None)
+def get_api():
+    """
+    Process-wide Airtable client; its requests.Session keeps connections alive.
+    pyairtable is imported here, on first use, so commands that never touch
+    Airtable don't pay for it.
+    """
+    import requests
+    from pyairtable import Api
+
+    class _ThrottledApi(Api):
+        # every HTTP call (including pagination and batch chunks) goes through request()
+        def request(self, method, *args, **kwargs):
+            LIMITER.acquire()
+            metrics.inc('airtable_http_requests_total', method=method.upper())
+            try:
+                return super().request(method, *args, **kwargs)
+            except requests.exceptions.HTTPError as e:
+                metrics.inc('airtable_http_errors_total', status=getattr(e.response, 'status_code', None))
+                raise
+
+    api_key = CONFIG['airtable'].get('api_key')
+    if not api_key:
+        raise ValueError("AIRTABLE_API_KEY not found in configuration")
+    # retries happen one level up, in retries.call, so urllib3's are turned off;
+    # the timeout turns a hung connection into a retryable error
+    timeout = CONFIG['airtable'].get('timeout_seconds') or 30
+    return _ThrottledApi(api_key, timeout=(timeout, timeout), retry_strategy=False)
+
+@lru_cache(maxsize=None)
 def get_table(table_key: str):
-    api_key = CONFIG['airtable']['api_key']
     base_id = CONFIG['airtable']['base_id']
     table_name = CONFIG['airtable']['tables'][table_key]
-    return Table(api_key, base_id, table_name)
+    return get_api().table(base_id, table_name)
 
-def fetch_all_records(table_key: str,formula: str = None):
-    tbl = get_table(table_key)
-    return tbl.all(formula=formula)
+# records per Airtable batch request
+BATCH_SIZE = 10
+
+def _batched(method, items: list):
+    # one request per chunk, so a retried chunk never repeats writes that already landed;
+    # sent chunks are removed from items, so after a failure it holds only the unsent ones
+    while items:
+        retries.call('airtable', method, items[:BATCH_SIZE])
+        del items[:BATCH_SIZE]
+
+class WriteBuffer:
+    """
+    Collects creates, updates and deletes per table and sends them through
+    Airtable's batch endpoints (10 records per request) on flush().
+    Repeated updates to the same record id are merged into one. Safe to
+    share between threads (see use_buffer).
+    """
+    def __init__(self, auto_flush: int = None):
+        self.auto_flush = auto_flush
+        self._flush_at = auto_flush
+        self._lock = threading.Lock()
+        self._creates = defaultdict(list)
+        self._updates = defaultdict(dict)
+        self._deletes = defaultdict(list)
+
+    def __len__(self):
+        with self._lock:
+            return (sum(len(v) for v in self._creates.values())
+                    + sum(len(v) for v in self._updates.values())
+                    + sum(len(v) for v in self._deletes.values()))
+
+    def create(self, table_key: str, fields: dict):
+        with self._lock:
+            self._creates[table_key].append(dict(fields))
+        self._maybe_flush()
+
+    def update(self, table_key: str, record_id: str, fields: dict):
+        with self._lock:
+            self._updates[table_key].setdefault(record_id, {}).update(fields)
+        self._maybe_flush()
+
+    def delete(self, table_key: str, record_id: str):
+        with self._lock:
+            # no point patching a record we are about to delete
+            self._updates[table_key].pop(record_id, None)
+            if record_id not in self._deletes[table_key]:
+                self._deletes[table_key].append(record_id)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if not self.auto_flush or len(self) < self._flush_at:
+            return
+        try:
+            self.flush()
+            self._flush_at = self.auto_flush
+        except Exception as e:
+            # the unsent writes are back in the buffer; the caller that happened to
+            # trip the flush is not at fault, so try again once more writes pile up
+            logging.warning(f'Auto-flush failed, keeping {len(self)} writes for the next flush: {e}')
+            self._flush_at = len(self) + self.auto_flush
+
+    def flush(self):
+        """Sends everything pending and returns {'create': n, 'update': n, 'delete': n}."""
+        with metrics.timer('stage_seconds', stage='writeback'):
+            return self._flush()
+
+    def _take(self):
+        with self._lock:
+            pending = self._creates, self._updates, self._deletes
+            self._creates, self._updates, self._deletes = defaultdict(list), defaultdict(dict), defaultdict(list)
+        return pending
+
+    def merge(self, other: 'WriteBuffer'):
+        """Moves everything pending in `other` into this buffer."""
+        creates, updates, deletes = other._take()
+        for table_key, rows in creates.items():
+            for fields in rows:
+                self.create(table_key, fields)
+        for table_key, rows in updates.items():
+            for record_id, fields in rows.items():
+                self.update(table_key, record_id, fields)
+        for table_key, ids in deletes.items():
+            for record_id in ids:
+                self.delete(table_key, record_id)
+
+    def _restore(self, creates, updates, deletes):
+        # puts back what a failed flush did not send; writes queued since then win
+        with self._lock:
+            for table_key, rows in creates.items():
+                self._creates[table_key][:0] = rows
+            for table_key, rows in updates.items():
+                for record_id, fields in rows.items():
+                    if record_id not in self._deletes[table_key]:
+                        self._updates[table_key][record_id] = {**fields, **self._updates[table_key].get(record_id, {})}
+            for table_key, ids in deletes.items():
+                for record_id in ids:
+                    self._updates[table_key].pop(record_id, None)
+                    if record_id not in self._deletes[table_key]:
+                        self._deletes[table_key].append(record_id)
+
+    def _flush(self):
+        creates, updates, deletes = self._take()
+        counts = {'create': 0, 'update': 0, 'delete': 0}
+
+        def send(table_key, op, method, items):
+            if not items:
+                return
+            metrics.inc('airtable_calls_total', table=table_key, op=f'batch_{op}')
+            n = len(items)
+            try:
+                _batched(getattr(get_table(table_key), method), items)
+            finally:
+                counts[op] += n - len(items)
+
+        try:
+            for table_key, rows in creates.items():
+                send(table_key, 'create', 'batch_create', rows)
+            for table_key, rows in updates.items():
+                items = [{'id': rid, 'fields': f} for rid, f in rows.items()]
+                try:
+                    send(table_key, 'update', 'batch_update', items)
+                finally:
+                    updates[table_key] = {i['id']: i['fields'] for i in items}
+            for table_key, ids in deletes.items():
+                send(table_key, 'delete', 'batch_delete', ids)
+        except Exception:
+            # nothing is dropped: whatever was not sent waits for the next flush
+            self._restore(creates, updates, deletes)
+            raise
+        finally:
+            for op, n in counts.items():
+                metrics.inc('airtable_records_written_total', n, op=op)
+        return counts
+
+_local = threading.local()
+
+def active_buffer():
+    return getattr(_local, 'buffer', None)
+
+@contextmanager
+def write_buffer(auto_flush: int = None):
+    """
+    Routes create_record/update_record/delete_record on this thread into a
+    WriteBuffer that is flushed on exit. Nested blocks share the outer buffer.
+    """
+    outer = active_buffer()
+    if outer is not None:
+        yield outer
+        return
+    buf = WriteBuffer(auto_flush=auto_flush)
+    _local.buffer = buf
+    try:
+        yield buf
+    finally:
+        _local.buffer = None
+        buf.flush()
 
+@contextmanager
+def use_buffer(buf: WriteBuffer):
+    """
+    Routes this thread's writes into an existing buffer, e.g. one shared by
+    several worker threads. The caller owns flushing it.
+    """
+    outer = active_buffer()
+    _local.buffer = buf
+    try:
+        yield buf
+    finally:
+        _local.buffer = outer
+
+class UnitOfWork:
+    """
+    Identity map for one pipeline run. Reads through fetch_all_records,
+    find_by_field, find_many_by_field and get_record are memoised, every
+    record id maps to one shared dict, and writes made during the run are
+    applied to that dict so later reads see them. `saved` counts the reads
+    answered without calling Airtable.
+    """
+    def __init__(self):
+        self._records = {}    # (table_key, record id) -> record
+        self._complete = set()  # (table_key, record id) read with every field
+        self._queries = {}    # (table_key, formula, fields) -> [record ids]
+        self.saved = 0
+
+    def _hit(self, table_key):
+        self.saved += 1
+        metrics.inc('airtable_calls_saved_total', table=table_key)
+
+    def _adopt(self, table_key: str, rec: dict, complete: bool) -> dict:
+        key = (table_key, rec['id'])
+        known = self._records.get(key)
+        if known is None:
+            known = self._records[key] = rec
+        else:
+            known['fields'].update(rec['fields'])
+        if complete:
+            self._complete.add(key)
+        return known
+
+    def cached(self, table_key: str, formula: str, fields):
+        """Records for a query already run in this unit of work, or None."""
+        ids = self._queries.get((table_key, formula, tuple(fields or ())))
+        if ids is None:
+            return None
+        self._hit(table_key)
+        return [self._records[(table_key, i)] for i in ids if (table_key, i) in self._records]
+
+    def remember(self, table_key: str, formula: str, fields, records) -> list:
+        records = [self._adopt(table_key, r, not fields) for r in records]
+        self._queries[(table_key, formula, tuple(fields or ()))] = [r['id'] for r in records]
+        return records
+
+    def get(self, table_key: str, record_id: str, fetch) -> dict:
+        key = (table_key, record_id)
+        if key in self._complete:
+            self._hit(table_key)
+            return self._records[key]
+        return self._adopt(table_key, fetch(), True)
+
+    def created(self, table_key: str):
+        # a new row may match any earlier query on its table
+        self._queries = {k: v for k, v in self._queries.items() if k[0] != table_key}
+
+    def updated(self, table_key: str, record_id: str, fields: dict):
+        rec = self._records.get((table_key, record_id))
+        if rec is not None:
+            rec['fields'].update(fields)
+        # queries filtering on a changed field may no longer match
+        names = ['{' + name + '}' for name in fields]
+        self._queries = {k: v for k, v in self._queries.items()
+                         if k[0] != table_key or not k[1] or not any(n in k[1] for n in names)}
+
+    def deleted(self, table_key: str, record_id: str):
+        self._records.pop((table_key, record_id), None)
+        self._complete.discard((table_key, record_id))
+
+def active_unit_of_work():
+    return getattr(_local, 'unit_of_work', None)
+
+@contextmanager
+def unit_of_work():
+    """
+    Memoises Airtable reads on this thread for the length of the block (see
+    UnitOfWork). Nested blocks share the outer one.
+    """
+    outer = active_unit_of_work()
+    if outer is not None:
+        yield outer
+        return
+    uow = UnitOfWork()
+    _local.unit_of_work = uow
+    try:
+        yield uow
+    finally:
+        _local.unit_of_work = None
+
+def _list(table_key: str, formula: str, fields, op: str):
+    uow = active_unit_of_work()
+    if uow is not None:
+        rows = uow.cached(table_key, formula, fields)
+        if rows is not None:
+            return rows
+    metrics.inc('airtable_calls_total', table=table_key, op=op)
+    rows = retries.call('airtable', get_table(table_key).all, formula=formula, fields=fields)
+    return uow.remember(table_key, formula, fields, rows) if uow is not None else rows
+
+def fetch_all_records(table_key: str, formula: str = None, fields=None):
+    return _list(table_key, formula, fields, 'list')
+
+def get_record(table_key: str, record_id: str):
+    def fetch():
+        metrics.inc('airtable_calls_total', table=table_key, op='get')
+        return retries.call('airtable', get_table(table_key).get, record_id)
+    uow = active_unit_of_work()
+    return uow.get(table_key, record_id, fetch) if uow is not None else fetch()
+
+# inside a write_buffer() block these queue the write and return None
 def create_record(table_key: str, fields: dict):
+    uow = active_unit_of_work()
+    if uow is not None:
+        uow.created(table_key)
+    buf = active_buffer()
+    if buf is not None:
+        return buf.create(table_key, fields)
+    metrics.inc('airtable_calls_total', table=table_key, op='create')
     tbl = get_table(table_key)
-    return tbl.create(fields)
+    return retries.call('airtable', tbl.create, fields)
 
 def update_record(table_key: str, record_id: str, fields: dict):
+    uow = active_unit_of_work()
+    if uow is not None:
+        uow.updated(table_key, record_id, fields)
+    buf = active_buffer()
+    if buf is not None:
+        return buf.update(table_key, record_id, fields)
+    metrics.inc('airtable_calls_total', table=table_key, op='update')
     tbl = get_table(table_key)
-    return tbl.update(record_id, fields)
+    return retries.call('airtable', tbl.update, record_id, fields)
+
+def delete_record(table_key: str, record_id: str):
+    uow = active_unit_of_work()
+    if uow is not None:
+        uow.deleted(table_key, record_id)
+    buf = active_buffer()
+    if buf is not None:
+        return buf.delete(table_key, record_id)
+    metrics.inc('airtable_calls_total', table=table_key, op='delete')
+    tbl = get_table(table_key)
+    return retries.call('airtable', tbl.delete, record_id)
+
+def quote_value(value) -> str:
+    """Airtable string literal for value; backslashes and quotes are escaped."""
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
 
-def find_by_field(table_key: str, field_name: str, value: str):
+def field_equals(field_name: str, value) -> str:
+    return f"{{{field_name}}}={quote_value(value)}"
+
+def _or_chunks(all_terms):
+    # greedy: add terms until the URL-encoded formula would pass the limit
+    terms, size = [], len(url_quote('OR()'))
+    for term in all_terms:
+        cost = len(url_quote(term, safe='')) + 3
+        if terms and size + cost > MAX_FORMULA_URL_CHARS:
+            yield terms
+            terms, size = [], len(url_quote('OR()'))
+        terms.append(term)
+        size += cost
+    if terms:
+        yield terms
+
+def _find_any(table_key: str, terms, fields=None):
+    # every record matching any of the formula terms, one list request per OR(...) chunk
     tbl = get_table(table_key)
-    formula = f"{{{field_name}}}='{value}'"
-    return tbl.all(formula=formula)
+    for chunk in _or_chunks(terms):
+        metrics.inc('airtable_calls_total', table=table_key, op='find')
+        formula = chunk[0] if len(chunk) == 1 else f"OR({','.join(chunk)})"
+        yield from retries.call('airtable', tbl.all, formula=formula, fields=fields)
+
+def find_any_by_field(table_key: str, field_name: str, values, fields=None) -> list:
+    """
+    Records whose field_name equals any of values, in as few list requests
+    as the formula length allows. Unlike find_many_by_field the rows are
+    not grouped by value, so it also suits linked-record fields, whose
+    formula value (the linked primary field) differs from the record ids
+    the API returns.
+    """
+    terms = [field_equals(field_name, v) for v in dict.fromkeys(str(v) for v in values)]
+    return list({rec['id']: rec for rec in _find_any(table_key, terms, fields)}.values())
+
+def get_records(table_key: str, record_ids, fields=None) -> dict:
+    """Many records by id with chunked RECORD_ID() formulas; {record id: record} for those that exist."""
+    terms = [f"RECORD_ID()={quote_value(rid)}" for rid in dict.fromkeys(record_ids)]
+    return {rec['id']: rec for rec in _find_any(table_key, terms, fields)}
+
+def find_by_field(table_key: str, field_name: str, value: str, fields=None):
+    return _list(table_key, field_equals(field_name, value), fields, 'find')
+
+def find_many_by_field(table_key: str, field_name: str, values, fields=None):
+    """
+    Looks up many values of one field with as few list requests as the
+    formula length allows. `fields` limits the columns returned (field_name
+    is always included). Returns {value: [records]}, with [] for values
+    that matched nothing.
+    """
+    wanted = list(dict.fromkeys(str(v) for v in values))
+    found = {v: [] for v in wanted}
+    if fields is not None and field_name not in fields:
+        fields = [*fields, field_name]
+    uow = active_unit_of_work()
+    if uow is not None:
+        misses = []
+        for v in wanted:
+            rows = uow.cached(table_key, field_equals(field_name, v), fields)
+            if rows is None:
+                misses.append(v)
+            else:
+                found[v] = rows
+        wanted = misses
+    fetched = {v: [] for v in wanted}
+    for rec in _find_any(table_key, [field_equals(field_name, v) for v in wanted], fields):
+        value = rec['fields'].get(field_name)
+        # linked-record fields come back as lists
+        for v in value if isinstance(value, list) else [value]:
+            if str(v) in fetched:
+                fetched[str(v)].append(rec)
+    for v, rows in fetched.items():
+        # later find_by_field calls for these values are answered from memory
+        found[v] = uow.remember(table_key, field_equals(field_name, v), fields, rows) if uow is not None else rows
+    return found
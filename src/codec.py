@@ -0,0 +1,45 @@
+"""
+Versioned codec for the Compressed JSON long-text field.
+
+Version 2 drops null/empty values and whitespace; payloads over the pack
+threshold (or with pack=True) are zlib-compressed and base64-encoded behind
+a "z1:" header. decode() reads version 1 (plain, indented JSON written by
+older runs) and both version 2 forms.
+"""
+import base64
+import json
+import zlib
+from config import section
+
+FORMAT_VERSION = "2.0.0"
+PACK_HEADER = "z1:"
+# Airtable long text holds 100k characters; pack well before that by default
+PACK_THRESHOLD = section('compressed_json').get('pack_threshold') or 20000
+
+def _prune(value):
+    if isinstance(value, dict):
+        out = {k: _prune(v) for k, v in value.items()}
+        return {k: v for k, v in out.items() if v not in (None, '', [], {})}
+    if isinstance(value, list):
+        return [v for v in (_prune(v) for v in value) if v not in (None, '', [], {})]
+    return value
+
+def encode(payload: dict, pack: bool = None) -> str:
+    """
+    Serialises a compressed payload as version 2. pack=None packs only when
+    the JSON is longer than PACK_THRESHOLD characters.
+    """
+    body = _prune({**payload, "version": FORMAT_VERSION})
+    text = json.dumps(body, separators=(',', ':'), ensure_ascii=False, default=str)
+    if pack or (pack is None and len(text) > PACK_THRESHOLD):
+        return PACK_HEADER + base64.b64encode(zlib.compress(text.encode('utf-8'), 9)).decode('ascii')
+    return text
+
+def decode(text) -> dict:
+    """Parses any stored Compressed JSON value (v1 or v2, packed or not)."""
+    if isinstance(text, dict):
+        return text
+    text = text.strip()
+    if text.startswith(PACK_HEADER):
+        text = zlib.decompress(base64.b64decode(text[len(PACK_HEADER):])).decode('utf-8')
+    return json.loads(text)
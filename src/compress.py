@@ -1,34 +1,97 @@
-import json
-from airtable_utils import fetch_all_records, find_by_field,update_record
+from airtable_utils import fetch_all_records, find_any_by_field, find_by_field, find_many_by_field, update_record
 from datetime import datetime, timezone
+import codec
 
-def build_compressed_json(applicant_id):
-    # fetch applicant parent row
-    apps = find_by_field('applicants', 'Applicant ID', applicant_id)
-    if not apps:
-        raise ValueError('Applicant not found')
-    app_rec = apps[0]
-    # fetch child tables by Applicant ID
-    personal = find_by_field('personal', 'Applicant ID', applicant_id)
-    work = fetch_all_records('work')
-    work_filtered = [w['fields'] for w in work if w['fields'].get('Applicant ID') and applicant_id in (w['fields'].get('Applicant ID') or [])]
-    salary = find_by_field('salary', 'Applicant ID', applicant_id)
-    payload = {
-        "version":"1.0.0",
+# tables pulled in one pass by build_index (keys from config.yaml)
+INDEX_TABLES = ('applicants', 'personal', 'work', 'salary', 'shortlisted')
+# link field that points each child table back at its Applicants row
+LINK_FIELDS = {
+    'personal': 'Applicant ID',
+    'work': 'Applicant ID',
+    'salary': 'Applicant ID',
+    'shortlisted': 'Applicant',
+}
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _fetch_for(applicant_ids):
+    # only the rows of these applicants, a few chunked OR(...) lookups per table
+    found = find_many_by_field('applicants', 'Applicant ID', applicant_ids)
+    tables = {'applicants': [rec for rows in found.values() for rec in rows]}
+    for key, link_field in LINK_FIELDS.items():
+        tables[key] = find_any_by_field(key, link_field, applicant_ids)
+    return tables
+
+def build_index(snapshot=None, applicant_ids=None):
+    """
+    Reads each configured table once and groups the rows by Applicant ID.
+    Returns {applicant_id: {'applicant': rec, 'personal': [...], 'work': [...],
+    'salary': [...], 'shortlisted': [...]}} so a whole backlog can be
+    compressed without going back to Airtable per applicant. With a
+    snapshot.Snapshot the rows come from local files instead; with
+    applicant_ids only those applicants' rows are read.
+    """
+    if snapshot is not None:
+        tables = {key: snapshot.records(key) for key in INDEX_TABLES}
+    elif applicant_ids is not None:
+        tables = _fetch_for(applicant_ids)
+    else:
+        tables = {key: fetch_all_records(key) for key in INDEX_TABLES}
+    index = {}
+    # child tables link to the Applicants record id; map it to the Applicant ID value
+    rec_to_aid = {}
+    for rec in tables['applicants']:
+        aid = rec['fields'].get('Applicant ID') or rec['id']
+        rec_to_aid[rec['id']] = aid
+        index[aid] = {'applicant': rec, 'personal': [], 'work': [], 'salary': [], 'shortlisted': []}
+    for key, link_field in LINK_FIELDS.items():
+        for rec in tables[key]:
+            for linked in _as_list(rec['fields'].get(link_field)):
+                aid = rec_to_aid.get(linked, linked)
+                if aid in index:
+                    index[aid][key].append(rec)
+    return index
+
+def _assemble_payload(applicant_id, personal, work, salary):
+    return {
+        "version": codec.FORMAT_VERSION,
         "applicant_id": applicant_id,
         "personal": personal[0]['fields'] if personal else {},
-        "experience": work_filtered,
+        "experience": [w['fields'] for w in work],
         "salary": salary[0]['fields'] if salary else {},
         "meta": {
             "compressed_at": datetime.now(timezone.utc).isoformat(),
             "compressor_version": "v1"
         }
     }
+
+def build_compressed_json(applicant_id, index=None):
+    if index is not None:
+        # batch mode: every row was already read by build_index
+        entry = index.get(applicant_id)
+        if not entry:
+            raise ValueError('Applicant not found')
+        payload = _assemble_payload(applicant_id, entry['personal'], entry['work'], entry['salary'])
+        record_id = entry['applicant']['id']
+    else:
+        # fetch applicant parent row
+        apps = find_by_field('applicants', 'Applicant ID', applicant_id)
+        if not apps:
+            raise ValueError('Applicant not found')
+        app_rec = apps[0]
+        # fetch child tables by Applicant ID
+        personal = find_by_field('personal', 'Applicant ID', applicant_id)
+        work = find_by_field('work', 'Applicant ID', applicant_id)
+        salary = find_by_field('salary', 'Applicant ID', applicant_id)
+        payload = _assemble_payload(applicant_id, personal, work, salary)
+        record_id = app_rec['id']
     # Update the parent record with the compressed JSON
-    update_record('applicants', applicant_id, {'Compressed JSON': json.dumps(payload, indent=2, default=str)})
-    
+    update_record('applicants', record_id, {'Compressed JSON': codec.encode(payload)})
+
     return payload
-    #return json.dumps(payload, indent=2, default=str)
 
 if __name__ == '__main__':
     import sys
@@ -0,0 +1,32 @@
+import logging
+import os
+import re
+from functools import lru_cache
+import yaml
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+_ENV_REF = re.compile(r'\$\{(\w+)\}')
+# used when neither PIPELINE_CONFIG nor ./config.yaml exists (e.g. running from src/)
+_REPO_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yaml')
+
+def config_path():
+    path = os.environ.get('PIPELINE_CONFIG') or 'config.yaml'
+    return path if os.path.exists(path) else _REPO_CONFIG
+
+@lru_cache(maxsize=None)
+def load_config():
+    """
+    Parses config.yaml once per process, replacing ${VAR} with the
+    environment value (empty when unset). Values are never logged.
+    """
+    load_dotenv()
+    path = config_path()
+    with open(path) as f:
+        raw = _ENV_REF.sub(lambda m: os.environ.get(m.group(1), ''), f.read())
+    logger.debug(f"Loaded config from {path}")
+    return yaml.safe_load(raw)
+
+def section(name):
+    return load_config().get(name) or {}
@@ -1,92 +1,159 @@
 import json
 import sys
-from airtable_utils import find_by_field, create_record, fetch_all_records, update_record, get_table
-from datetime import datetime, timezone
+import codec
+from airtable_utils import create_record, fetch_all_records, update_record, delete_record, get_record, write_buffer, field_equals
 
-def decompress_and_upsert(applicant_id: str):
+PERSONAL_FIELDS = ('Full Name', 'Email', 'Location', 'LinkedIn')
+SALARY_FIELDS = ('Preferred Rate', 'Minimum Rate', 'Currency', 'Availability')
+# link back to the Applicants row; set by us, never compared
+LINK_FIELD = 'Applicant ID'
+# fields that identify "the same job" when its other details were edited
+WORK_IDENTITY = ('Company', 'Title', 'Start')
+
+def _norm(value):
+    # Airtable leaves empty fields out of responses, so None, '' and [] all mean "empty"
+    return None if value in (None, '', []) else value
+
+def _content(fields: dict, keys) -> tuple:
+    return tuple((k, json.dumps(_norm(fields.get(k)), sort_keys=True, default=str)) for k in keys)
+
+def _changed_fields(existing: dict, desired: dict) -> dict:
+    return {k: v for k, v in desired.items() if _norm(existing.get(k)) != _norm(v)}
+
+def plan_rows(existing_records, desired_rows):
     """
-    Reads the compressed JSON from the Applicants table and updates/upserts
-    records in the child tables to reflect the JSON state.
+    Minimal changeset turning existing_records into desired_rows.
+    Rows with identical content are left alone, rows that match on
+    WORK_IDENTITY (or are left over on both sides) are updated in place to
+    keep their record ids, and only the remainder is created or deleted.
+    Returns (creates, updates, deletes) as ([fields], [(id, fields)], [id]).
     """
-    applicants_table = get_table('applicants')
-    
-    try:
-        # Step 1: Read the compressed JSON from the Applicants table using the ID
-        applicant_record = applicants_table.get(applicant_id)
-        compressed_json_str = applicant_record['fields'].get('Compressed JSON')
-        
-        if not compressed_json_str:
-            print(f"No compressed JSON found for applicant {applicant_id}. Exiting.")
-            return
-
-        compressed_data = json.loads(compressed_json_str)
-        
-        # Step 2: Update/Upsert Personal Details
-        personal_data = compressed_data.get('personal', {})
-        # Use the correct table key from your config.yaml
-        existing_personal_records = fetch_all_records('personal', f"{{Applicant ID}}='{applicant_id}'")
-        
-        fields = {
-            'Full Name': personal_data.get('Full Name'),
-            'Email': personal_data.get('Email'),
-            'Location': personal_data.get('Location'),
-            'LinkedIn': personal_data.get('LinkedIn')
-        }
-
-        if existing_personal_records:
-            update_record('personal', existing_personal_records[0]['id'], fields)
-            print(f"Updated Personal Details record for applicant {applicant_id}")
+    keys = sorted({k for row in desired_rows for k in row} - {LINK_FIELD})
+    desired = [{k: row.get(k) for k in keys} for row in desired_rows]
+    existing = list(existing_records)
+
+    # 1. exact content matches need no write at all
+    by_content = {}
+    for rec in existing:
+        by_content.setdefault(_content(rec['fields'], keys), []).append(rec)
+    pending = []
+    for row in desired:
+        matches = by_content.get(_content(row, keys))
+        if matches:
+            existing.remove(matches.pop())
         else:
-            fields['Applicant ID'] = [applicant_id]
-            create_record('personal', fields)
-            print(f"Created new Personal Details record for applicant {applicant_id}")
-            
-        # Step 3: Update/Upsert Work Experience
-        # Use the correct table key
-        existing_experience_records = fetch_all_records('work', f"{{Applicant ID}}='{applicant_id}'")
-        work_table = get_table('work')
-        if existing_experience_records:
-             for rec in existing_experience_records:
-                 work_table.delete(rec['id'])
-        
-        for exp_fields in compressed_data.get('work', []):
-            create_record('work', {
-                **exp_fields, # Unpack dictionary
-                'Applicant ID': [applicant_id]
-            })
-        print(f"Recreated Work Experience records for applicant {applicant_id}")
-            
-        # Step 4: Update/Upsert Salary Preferences
-        # Use the correct table key
-        salary_data = compressed_data.get('salary', {})
-        existing_salary_records = fetch_all_records('salary', f"{{Applicant ID}}='{applicant_id}'")
-
-        fields = {
-            'Preferred Rate': salary_data.get('Preferred Rate'),
-            'Minimum Rate': salary_data.get('Minimum Rate'),
-            'Currency': salary_data.get('Currency'),
-            'Availability': salary_data.get('Availability')
-        }
-
-        if existing_salary_records:
-            update_record('salary', existing_salary_records[0]['id'], fields)
-            print(f"Updated Salary Preferences record for applicant {applicant_id}")
+            pending.append(row)
+
+    # 2. pair what is left, preferring rows describing the same job
+    updates = []
+    unpaired = []
+    for row in pending:
+        ident = _content(row, WORK_IDENTITY)
+        rec = next((r for r in existing if _content(r['fields'], WORK_IDENTITY) == ident), None)
+        if rec is None:
+            unpaired.append(row)
+            continue
+        existing.remove(rec)
+        updates.append((rec['id'], _changed_fields(rec['fields'], row)))
+    for rec, row in zip(list(existing), list(unpaired)):
+        existing.remove(rec)
+        unpaired.remove(row)
+        updates.append((rec['id'], _changed_fields(rec['fields'], row)))
+
+    return unpaired, [(rid, f) for rid, f in updates if f], [rec['id'] for rec in existing]
+
+def _upsert_single(table_key, label, applicant_id, existing_records, data, field_names):
+    fields = {k: data.get(k) for k in field_names}
+    if existing_records:
+        changed = _changed_fields(existing_records[0]['fields'], fields)
+        if changed:
+            update_record(table_key, existing_records[0]['id'], changed)
+            print(f"Updated {label} record for applicant {applicant_id}")
         else:
-            fields['Applicant ID'] = [applicant_id]
-            create_record('salary', fields)
-            print(f"Created new Salary Preferences record for applicant {applicant_id}")
+            print(f"{label} unchanged for applicant {applicant_id}")
+    else:
+        fields[LINK_FIELD] = [applicant_id]
+        create_record(table_key, fields)
+        print(f"Created new {label} record for applicant {applicant_id}")
 
-        print("Data decompressed successfully.")
+def _apply(applicant_id, compressed_data, personal, work, salary):
+    # Step 2: Update/Upsert Personal Details
+    _upsert_single('personal', 'Personal Details', applicant_id, personal,
+                   compressed_data.get('personal') or {}, PERSONAL_FIELDS)
 
-    except Exception as e:
-        print(f"Error during decompression: {e}")
+    # Step 3: Sync Work Experience (compress writes it under 'experience')
+    desired_work = compressed_data.get('experience', compressed_data.get('work')) or []
+    creates, updates, deletes = plan_rows(work, desired_work)
+    for fields in creates:
+        create_record('work', {**fields, LINK_FIELD: [applicant_id]})
+    for record_id, fields in updates:
+        update_record('work', record_id, fields)
+    for record_id in deletes:
+        delete_record('work', record_id)
+    print(f"Work Experience for applicant {applicant_id}: "
+          f"{len(creates)} created, {len(updates)} updated, {len(deletes)} deleted, "
+          f"{len(desired_work) - len(creates) - len(updates)} unchanged")
+
+    # Step 4: Update/Upsert Salary Preferences
+    _upsert_single('salary', 'Salary Preferences', applicant_id, salary,
+                   compressed_data.get('salary') or {}, SALARY_FIELDS)
+
+def decompress_and_upsert(applicant_id: str, index=None):
+    """
+    Reads the compressed JSON from the Applicants table and updates/upserts
+    records in the child tables to reflect the JSON state. Only fields and
+    rows that differ are written. Pass an index from compress.build_index to
+    skip the per-applicant reads.
+    """
+    # writes are queued and sent as batch calls when the block exits
+    with write_buffer():
+        try:
+            # Step 1: Read the compressed JSON from the Applicants table using the ID
+            entry = index.get(applicant_id) if index is not None else None
+            applicant_record = entry['applicant'] if entry else get_record('applicants', applicant_id)
+            compressed_json_str = applicant_record['fields'].get('Compressed JSON')
+
+            if not compressed_json_str:
+                print(f"No compressed JSON found for applicant {applicant_id}. Exiting.")
+                return
+
+            # v1 (indented JSON) and v2 (compact or zlib-packed) both decode here
+            compressed_data = codec.decode(compressed_json_str)
+            if entry:
+                personal, work, salary = entry['personal'], entry['work'], entry['salary']
+            else:
+                formula = field_equals('Applicant ID', applicant_id)
+                personal = fetch_all_records('personal', formula)
+                work = fetch_all_records('work', formula)
+                salary = fetch_all_records('salary', formula)
+
+            _apply(applicant_id, compressed_data, personal, work, salary)
+            print("Data decompressed successfully.")
+
+        except Exception as e:
+            print(f"Error during decompression: {e}")
+
+def decompress_many(applicant_ids=None):
+    """
+    Bulk mode: reads every table once and decompresses each applicant from
+    the shared index, with all writes going out in full batches.
+    """
+    from compress import build_index
+    index = build_index()
+    ids = list(index) if applicant_ids is None else applicant_ids
+    with write_buffer(auto_flush=100):
+        for aid in ids:
+            decompress_and_upsert(aid, index=index)
 
 if __name__ == '__main__':
     try:
-        aid = sys.argv[1]
-        decompress_and_upsert(aid)
+        if sys.argv[1] == '--all':
+            decompress_many()
+        else:
+            decompress_and_upsert(sys.argv[1])
     except IndexError:
         print("Error: You must provide an Applicant ID as a command-line argument.")
         print("Example: python decompress.py recYOURID")
+        print("         python decompress.py --all")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
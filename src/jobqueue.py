@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+from config import section
+
+QUEUE_CONFIG = section('queue')
+QUEUE_PATH = QUEUE_CONFIG.get('path') or '.cache/jobs.sqlite3'
+MAX_ATTEMPTS = QUEUE_CONFIG.get('max_attempts') or 3
+RETRY_BACKOFF = QUEUE_CONFIG.get('retry_backoff_seconds') or 30
+STALE_AFTER = QUEUE_CONFIG.get('stale_after_seconds') or 900
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+class JobQueue:
+    """
+    Durable applicant job queue in a local SQLite file. Any number of worker
+    processes can claim from the same file; claims are atomic, so each job
+    runs once at a time. Failed jobs are retried with exponential backoff
+    until max_attempts, then left in the 'failed' state.
+    """
+    def __init__(self, path: str = QUEUE_PATH, max_attempts: int = MAX_ATTEMPTS, retry_backoff: float = RETRY_BACKOFF):
+        self.path = os.path.abspath(path)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " applicant_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT,"
+            " worker TEXT,"
+            " enqueued_at REAL NOT NULL,"
+            " available_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # autocommit; transactions are opened explicitly where they matter
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, applicant_id: str, delay: float = 0.0, max_wait: float = None) -> int:
+        """
+        Adds a job unless one is already pending for this applicant; returns
+        the job id. With max_wait, calls for an already pending job debounce
+        it: its start moves to now + delay, but never later than max_wait
+        after it was first enqueued.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, enqueued_at FROM jobs WHERE applicant_id = ? AND state = ?",
+                               (applicant_id, PENDING)).fetchone()
+            if row:
+                job_id = row['id']
+                if max_wait is not None:
+                    conn.execute("UPDATE jobs SET available_at = ? WHERE id = ?",
+                                 (min(now + delay, row['enqueued_at'] + max_wait), job_id))
+            else:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (applicant_id, state, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+                    (applicant_id, PENDING, now, now + delay)).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self, worker: str = None):
+        """Marks the oldest ready pending job as running and returns it as a dict, or None."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? AND available_at <= ? ORDER BY available_at, id LIMIT 1",
+                (PENDING, now)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET state = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                             (RUNNING, worker, now, row['id']))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = dict(row)
+        job.update(state=RUNNING, worker=worker, started_at=now, attempts=row['attempts'] + 1)
+        return job
+
+    def complete(self, job_id: int):
+        self._conn().execute("UPDATE jobs SET state = ?, finished_at = ?, last_error = NULL WHERE id = ?",
+                             (DONE, time.time(), job_id))
+
+    def fail(self, job_id: int, error: str):
+        """Schedules a retry with backoff, or marks the job failed once attempts run out."""
+        conn = self._conn()
+        now = time.time()
+        attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()['attempts']
+        if attempts < self.max_attempts:
+            conn.execute("UPDATE jobs SET state = ?, last_error = ?, available_at = ? WHERE id = ?",
+                         (PENDING, error, now + self.retry_backoff * 2 ** (attempts - 1), job_id))
+        else:
+            conn.execute("UPDATE jobs SET state = ?, last_error = ?, finished_at = ? WHERE id = ?",
+                         (FAILED, error, now, job_id))
+
+    def defer(self, job_id: int, delay: float):
+        """Puts a claimed job back without using up an attempt, e.g. while a backend is down."""
+        self._conn().execute("UPDATE jobs SET state = ?, attempts = attempts - 1, available_at = ? WHERE id = ?",
+                             (PENDING, time.time() + delay, job_id))
+
+    def requeue_stale(self, older_than: float = STALE_AFTER) -> int:
+        """
+        Puts back jobs left running by a worker that died; returns how many.
+        A job that has already used max_attempts (one that keeps killing its
+        worker) is marked failed instead.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET state = ?, last_error = ?, finished_at = ? WHERE state = ? AND started_at < ? AND attempts >= ?",
+                (FAILED, 'worker died while running the job', now, RUNNING, now - older_than, self.max_attempts))
+            requeued = conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ? WHERE state = ? AND started_at < ?",
+                (PENDING, now, RUNNING, now - older_than)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return requeued
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0, **{r['state']: r['n'] for r in rows}}
+
+    def get(self, job_id: int):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
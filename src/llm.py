@@ -1,14 +1,12 @@
-import os
 import sys
 import logging
-import json
-import hashlib
-from time import sleep
-from dotenv import load_dotenv
-from yaml import safe_load
-from pyairtable import Api
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-import google.generativeai as genai
+import re
+from functools import lru_cache
+from airtable_utils import update_record
+from config import load_config
+from llm_cache import ResultCache, cache_key
+import metrics
+from retries import retrying
 
 # Configure logging
 logging.basicConfig(
@@ -17,45 +15,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+CONFIG = load_config()
+MODEL = CONFIG["gemini"].get("model") or "gemini-1.5-flash"  # Default model
 
-# Load configuration from config.yaml
-def _load_config():
-    try:
-        with open("config.yaml") as f:
-            raw = f.read()
-        for k, v in os.environ.items():
-            raw = raw.replace("${" + k + "}", v)
-        config = safe_load(raw)
-        logger.info(f"Loaded config: {config}")
-        return config
-    except Exception as e:
-        logger.error(f"Failed to load config.yaml: {str(e)}")
-        raise
-
-CONFIG = _load_config()
-gemini_api_key = CONFIG["gemini"]["api_key"]
-airtable_api_key = CONFIG["airtable"]["api_key"]
-airtable_base_id = CONFIG["airtable"]["base_id"]
-airtable_applicants_table = CONFIG["airtable"]["tables"]["applicants"]
-MODEL = CONFIG["gemini"].get("model", "gemini-1.5-flash")  # Default model
-REQUEST_DELAY = 10.0
+# Built on first use by get_gemini_model(); tests may assign a stand-in directly
+gemini_model = None
 
-# Verify API keys
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY not found in configuration")
-if not airtable_api_key:
-    raise ValueError("AIRTABLE_API_KEY not found in configuration")
 
-logger.info(f"Using Gemini model: {MODEL}, API key: {gemini_api_key[:5]}...")
-
-# Initialize Gemini client
-genai.configure(api_key=gemini_api_key)
-gemini_model = genai.GenerativeModel(MODEL)
-
-# Initialize Airtable client
-airtable_api = Api(airtable_api_key)
-applicants_table = airtable_api.table(airtable_base_id, airtable_applicants_table)
+def get_gemini_model():
+    """Configures Gemini on first call so importing this module stays cheap."""
+    global gemini_model
+    if gemini_model is None:
+        gemini_api_key = CONFIG["gemini"].get("api_key")
+        if not gemini_api_key:
+            raise ValueError("GEMINI_API_KEY not found in configuration")
+        import google.generativeai as genai
+        logger.info(f"Using Gemini model: {MODEL}")
+        genai.configure(api_key=gemini_api_key)
+        gemini_model = genai.GenerativeModel(MODEL)
+    return gemini_model
 
 PROMPT = """You are a recruiting analyst. Given this JSON applicant profile, do four things:
 1. Provide a concise 75-word summary.
@@ -69,28 +47,182 @@ Score: <integer>
 Issues: <comma-separated list or 'None'>
 Follow-Ups: <bullet list>
 """
+# bump whenever PROMPT changes so cached results from the old prompt are not reused
+PROMPT_VERSION = "1"
 
-@retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=10, max=120),
-    retry=retry_if_exception_type(Exception)
-)
-def call_llm_for_application(payload_json: str, max_tokens: int = 400):
-    logger.info(f"Calling Gemini with payload: {payload_json[:100]}...")
+class MalformedResponseError(ValueError):
+    """The model's output stopped following the Summary/Score/Issues/Follow-Ups format."""
+
+
+class SectionParser:
+    """
+    Incremental parser for the PROMPT output format. feed() accepts text as it
+    streams in; the score is available (and on_score called) as soon as its
+    line is complete, and `malformed` turns true as soon as the output can no
+    longer be a valid answer.
+    """
+    SECTIONS = ("summary", "score", "issues", "follow_ups")
+    _HEADER = re.compile(r"^[\s*#_]*(summary|score|issues|follow[- ]?ups)[\s*_]*:[\s*_]*(.*)$", re.IGNORECASE)
+    # this much text without a Summary header means the model ignored the format
+    PREAMBLE_LIMIT = 200
+
+    def __init__(self, on_score=None):
+        self.on_score = on_score
+        self.reset()
+
+    def reset(self):
+        self.text = ""
+        self.sections = {}
+        self.current = None
+        self.score = None
+        self.malformed = False
+        self._pending = ""
+        self._preamble = 0
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        for line in lines:
+            self._line(line)
+        # an unfinished line may be a long single-line "Summary: ..." still streaming in
+        if (self.current is None and not self._maybe_header(self._pending)
+                and self._preamble + len(self._pending.strip()) > self.PREAMBLE_LIMIT):
+            self.malformed = True
+
+    def _maybe_header(self, text: str) -> bool:
+        if self._HEADER.match(text):
+            return True
+        head = text.lstrip(" \t*#_").lower()
+        return any(name.startswith(head) for name in ("summary", "score", "issues", "follow-ups", "follow ups", "followups"))
+
+    def close(self):
+        if self._pending:
+            self._line(self._pending)
+            self._pending = ""
+        if self.current == "score":
+            self._finish_score()
+
+    def _line(self, line: str):
+        m = self._HEADER.match(line)
+        if m:
+            name = m.group(1).lower().replace("-", "_").replace(" ", "_")
+            name = "follow_ups" if name.startswith("follow") else name
+            if self.current == "score":
+                self._finish_score()
+            order = self.SECTIONS.index(name)
+            if name in self.sections or (self.current and order <= self.SECTIONS.index(self.current)):
+                self.malformed = True
+            self.current = name
+            self.sections[name] = [m.group(2)]
+        elif self.current:
+            self.sections[self.current].append(line)
+        elif line.strip():
+            self._preamble += len(line.strip())
+            if self._preamble > self.PREAMBLE_LIMIT:
+                self.malformed = True
+        if self.current == "score" and "".join(self.sections["score"]).strip():
+            self._finish_score()
+
+    def _finish_score(self):
+        if self.score is not None:
+            return
+        m = re.match(r"\s*(\d+)", "".join(self.sections.get("score", [])))
+        score = int(m.group(1)) if m else None
+        if score is None or not 1 <= score <= 10:
+            self.malformed = True
+            return
+        self.score = score
+        if self.on_score:
+            self.on_score(score)
+
+    def result(self) -> dict:
+        self.close()
+        def section(name):
+            return "\n".join(self.sections.get(name, [])).strip()
+        return {
+            "summary": section("summary"),
+            "score": self.score or 0,
+            "issues": section("issues"),
+            "follow_ups": section("follow_ups"),
+            "success": "summary" in self.sections,
+        }
+
+
+def generate_text(prompt: str, max_tokens: int, parser: SectionParser = None, **generation_config) -> str:
+    """
+    One Gemini request for an already-built prompt, with metrics; no retries.
+    With a parser the response is streamed into it, and generation is
+    abandoned with MalformedResponseError as soon as the parser rejects it.
+    """
+    metrics.inc("llm_requests_total")
     try:
-        response = gemini_model.generate_content(
-            PROMPT + "\nApplicant JSON:\n" + payload_json,
-            generation_config={
-                "max_output_tokens": max_tokens,
-                "temperature": 0.0
-            }
-        )
-        text = response.text
-        logger.info(f"Gemini response: {text[:100]}...")
-        return text
+        with metrics.timer("llm_latency_seconds"):
+            response = get_gemini_model().generate_content(
+                prompt,
+                generation_config={
+                    "max_output_tokens": max_tokens,
+                    "temperature": 0.0,
+                    **generation_config
+                },
+                stream=parser is not None
+            )
+            if parser is None:
+                text = response.text
+            else:
+                parser.reset()
+                for chunk in response:
+                    parser.feed(chunk.text)
+                    if parser.malformed:
+                        metrics.inc("llm_stream_aborts_total")
+                        raise MalformedResponseError(f"Malformed LLM output: {parser.text[:100]!r}")
+                parser.close()
+                text = parser.text
+    except Exception as e:
+        metrics.inc("llm_errors_total", error=type(e).__name__)
+        raise
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        metrics.inc("llm_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+        metrics.inc("llm_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, kind="output")
+    logger.debug(f"Gemini response: {text[:100]}...")
+    return text
+
+
+def generate_response(payload_json: str, max_tokens: int = 400, parser: SectionParser = None) -> str:
+    """Single Gemini request with no retries; callers decide how to back off."""
+    logger.debug(f"Calling Gemini with payload: {payload_json[:100]}...")
+    return generate_text(PROMPT + "\nApplicant JSON:\n" + payload_json, max_tokens, parser=parser)
+
+
+# only transient errors are retried; a malformed response at temperature 0 would just repeat
+@retrying("gemini")
+def call_llm_for_application(payload_json: str, max_tokens: int = 400, parser: SectionParser = None):
+    try:
+        return generate_response(payload_json, max_tokens, parser=parser)
     except Exception as e:
         logger.exception(f"Gemini call failed: {str(e)}")
-    raise
+        raise
+
+
+def evaluate_streaming(payload_json: str, on_score=None, max_tokens: int = 400, applicant_id: str = None) -> dict:
+    """
+    Streams one evaluation through a SectionParser and returns the parsed
+    result. on_score(score) fires as soon as the Score line arrives. Results
+    go through the same cache as evaluate_applicant, so an unchanged payload
+    is not sent to Gemini again.
+    """
+    cached = cache_lookup(applicant_id, payload_json)
+    if cached:
+        if on_score:
+            on_score(cached["score"])
+        return cached
+    parser = SectionParser(on_score=on_score)
+    call_llm_for_application(payload_json, max_tokens, parser=parser)
+    result = parser.result()
+    if result["success"]:
+        cache_store(applicant_id, payload_json, result)
+    return result
 
 
 def format_followups(followups_text: str) -> str:
@@ -115,12 +247,12 @@ def update_airtable(applicant_id: str, result: dict):
         }
 
         # 🔎 Debug logs
-        logger.info(f"Airtable update payload for {applicant_id}:")
+        logger.debug(f"Airtable update payload for {applicant_id}:")
         for k, v in fields.items():
-            logger.info(f"  {k} ({type(v)}): {repr(v)}")
+            logger.debug(f"  {k} ({type(v)}): {repr(v)}")
 
         # Send to Airtable
-        applicants_table.update(applicant_id, fields)
+        update_record('applicants', applicant_id, fields)
 
         logger.info(f"✅ Successfully updated Airtable for applicant {applicant_id}")
 
@@ -130,80 +262,98 @@ def update_airtable(applicant_id: str, result: dict):
 
 
 
+@lru_cache(maxsize=None)
+def get_result_cache() -> ResultCache:
+    cache_config = CONFIG.get("llm_cache") or {}
+    max_age_days = cache_config.get("max_age_days")
+    return ResultCache(
+        cache_config.get("path") or ".cache/llm_results.sqlite3",
+        max_entries=cache_config.get("max_entries"),
+        max_age_seconds=max_age_days * 86400 if max_age_days else None,
+    )
+
+
+def cache_lookup(applicant_id: str, payload_json: str):
+    result = get_result_cache().get(cache_key(payload_json, MODEL, PROMPT_VERSION))
+    metrics.inc("llm_cache_lookups_total", result="hit" if result else "miss")
+    if result:
+        logger.info(f"Using cached result for {applicant_id}")
+    return result
+
+
+def cache_store(applicant_id: str, payload_json: str, result: dict):
+    get_result_cache().put(cache_key(payload_json, MODEL, PROMPT_VERSION), result, applicant_id=applicant_id)
+
+
+def parse_llm_response(llm_response: str) -> dict:
+    parser = SectionParser()
+    parser.feed(llm_response)
+    return parser.result()
+
+
+def parse_and_cache(applicant_id: str, payload_json: str, llm_response: str) -> dict:
+    try:
+        result = parse_llm_response(llm_response)
+        # a reply without the expected sections would otherwise be served until it expires
+        if result["success"]:
+            cache_store(applicant_id, payload_json, result)
+    except Exception as parse_error:
+        logger.error(f"Failed to parse response for {applicant_id}: {parse_error}")
+        result = {"success": False, "error": f"Parse error: {parse_error}"}
+    return result
+
+
 def evaluate_applicant(applicant_id: str, payload_json: str) -> dict:
     try:
         logger.info(f"Evaluating applicant {applicant_id}")
-        json_hash = hashlib.sha256(payload_json.encode()).hexdigest()
-        cache_file = f"cache_{applicant_id}.json"
-        cached_result = None
-        try:
-            with open(cache_file, "r") as f:
-                cached = json.load(f)
-                if cached["hash"] == json_hash:
-                    logger.info(f"Using cached result for {applicant_id}")
-                    cached_result = cached["result"]
-        except FileNotFoundError:
-            pass
-
+        cached_result = cache_lookup(applicant_id, payload_json)
         if cached_result:
             return cached_result
 
         llm_response = call_llm_for_application(payload_json)
-        result = {
-            "summary": "",
-            "score": 0,
-            "issues": "",
-            "follow_ups": "",
-            "success": False,
-        }
-        try:
-            if "Summary:" in llm_response:
-                parts = llm_response.split("Summary:")[1].split("Score:")
-                result["summary"] = parts[0].strip()
-                result["success"] = True
-            if "Score:" in llm_response:
-                score_part = llm_response.split("Score:")[1].split("Issues:")[0].strip()
-                result["score"] = int(score_part) if score_part.isdigit() else 0
-            if "Issues:" in llm_response:
-                issues_part = llm_response.split("Issues:")[1]
-                if "Follow-Ups:" in issues_part:
-                    result["issues"] = issues_part.split("Follow-Ups:")[0].strip()
-            if "Follow-Ups:" in llm_response:
-                result["follow_ups"] = llm_response.split("Follow-Ups:")[1].strip()
-
-            with open(cache_file, "w") as f:
-                json.dump({"hash": json_hash, "result": result}, f)
-        except Exception as parse_error:
-            logger.error(f"Failed to parse response for {applicant_id}: {parse_error}")
-            result["error"] = f"Parse error: {parse_error}"
-            result["success"] = False
-        return result
+        return parse_and_cache(applicant_id, payload_json, llm_response)
     except Exception as e:
         logger.error(f"Evaluation failed for {applicant_id}: {str(e)}")
         return {"success": False, "error": str(e)}
 
 def main():
     logger.info("Starting script")
-    if len(sys.argv) < 2:
-        logger.error("No applicant ID provided. Usage: python l2_gemini.py <applicant_id>")
+    # --packed sends several applicants per Gemini request (see llm_packed.py)
+    packed = "--packed" in sys.argv[1:]
+    applicant_ids = [a for a in sys.argv[1:] if a != "--packed"]
+    if not applicant_ids:
+        logger.error("No applicant ID provided. Usage: python llm.py [--packed] <applicant_id> [<applicant_id> ...]")
         print("Error: Please provide an applicant ID as a command-line argument.")
         sys.exit(1)
 
-    applicant_ids = [sys.argv[1]]
+    items = []
     for applicant_id in applicant_ids:
         try:
             logger.info(f"Processing applicant {applicant_id}")
             try:
                 from compress import build_compressed_json
-                payload_json = json.dumps(build_compressed_json(applicant_id))
+                from projection import project_for_llm
+                projection = project_for_llm(build_compressed_json(applicant_id))
+                logger.info(f"Projected payload for {applicant_id}: ~{projection.tokens} tokens")
+                metrics.inc("llm_payload_tokens_total", projection.tokens)
+                payload_json = projection.payload_json
             except ImportError:
                 logger.warning("compress module not found, using dummy JSON")
                 payload_json = '{"name": "John Doe", "experience": "5 years at Google"}'
 
             logger.debug(f"Compressed JSON: {payload_json[:200]}...")
-            result = evaluate_applicant(applicant_id, payload_json)
+            items.append((applicant_id, payload_json))
+        except Exception as e:
+            logger.error(f"Failed to process applicant {applicant_id}: {str(e)}")
+            print(f"\n🔥 Error: {str(e)}")
+
+    # requests run concurrently under the adaptive limiter instead of a fixed sleep
+    from llm_engine import evaluate_batch
+
+    def report(applicant_id, result):
+        try:
             if result["success"]:
-                print("\n=== Evaluation Results ===")
+                print(f"\n=== Evaluation Results ({applicant_id}) ===")
                 print(f"LLM Summary: {result['summary']}")
                 print(f"LLM Score: {result['score']}")
                 print(f"Issues: {result['issues']}")
@@ -211,11 +361,17 @@ def main():
                 print(result["follow_ups"])
                 update_airtable(applicant_id, result)
             else:
-                print(f"\n❌ Evaluation failed: {result.get('error', 'Unknown error')}")
-            sleep(REQUEST_DELAY)
+                print(f"\n❌ Evaluation failed for {applicant_id}: {result.get('error', 'Unknown error')}")
         except Exception as e:
             logger.error(f"Failed to process applicant {applicant_id}: {str(e)}")
             print(f"\n🔥 Error: {str(e)}")
 
+    if packed:
+        from llm_packed import evaluate_packed
+        for applicant_id, result in evaluate_packed(items).items():
+            report(applicant_id, result)
+    else:
+        evaluate_batch(items, on_result=report)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# meta fields that change on every compress run and must not affect the key
+VOLATILE_META_KEYS = ("compressed_at",)
+
+
+def canonical_payload(payload) -> str:
+    """Stable JSON for a compressed payload: sorted keys, no whitespace, volatile meta removed."""
+    if isinstance(payload, (str, bytes)):
+        payload = json.loads(payload)
+    if isinstance(payload, dict) and isinstance(payload.get("meta"), dict):
+        meta = {k: v for k, v in payload["meta"].items() if k not in VOLATILE_META_KEYS}
+        payload = {**payload, "meta": meta}
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(payload, model: str, prompt_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, canonical_payload(payload)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed store of parsed LLM results in a single SQLite file.
+    Safe to share between threads and worker processes (WAL mode, one
+    connection per thread). Entries older than max_age_seconds are ignored
+    and evicted; beyond max_entries the least recently used are dropped.
+    """
+    def __init__(self, path: str, max_entries: int = None, max_age_seconds: float = None):
+        # absolute so connections opened later from other threads/cwds hit the same file
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " applicant_id TEXT,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+            self._count(False)
+            return None
+        conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        self._count(True)
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict, applicant_id: str = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, applicant_id, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, applicant_id, json.dumps(result), now, now),
+        )
+        conn.commit()
+        if self.max_entries:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drops expired entries and trims to max_entries; returns how many were removed."""
+        conn = self._conn()
+        removed = 0
+        if self.max_age_seconds:
+            removed += conn.execute("DELETE FROM results WHERE created_at < ?",
+                                    (time.time() - self.max_age_seconds,)).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        conn.commit()
+        return removed
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+import time
+
+import metrics
+from config import section
+from llm import cache_lookup, generate_response, parse_and_cache
+from retries import CircuitOpenError, backoff, breaker, is_transient, retry_after, settings
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CONFIG = section("gemini")
+DEFAULT_CONCURRENCY = GEMINI_CONFIG.get("concurrency") or 4
+DEFAULT_REQUESTS_PER_MINUTE = GEMINI_CONFIG.get("requests_per_minute") or 15
+# quota errors only slow the limiter down; give up after this many for one applicant
+MAX_QUOTA_RETRIES = 20
+
+
+def is_quota_error(exc: Exception) -> bool:
+    """True for Gemini 429 / quota-exhausted errors, which should slow us down rather than fail."""
+    name = type(exc).__name__
+    if name in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(exc).lower()
+    return "429" in text or "quota" in text or "rate limit" in text
+
+
+class AdaptiveRateLimiter:
+    """
+    Spaces requests at `rate` per second. The rate is halved on every quota
+    error (down to min_rate) and creeps back up by `increase` after each
+    success (up to max_rate), so throughput settles just under the quota.
+    """
+    def __init__(self, rate: float, min_rate: float = None, max_rate: float = None, increase: float = None):
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.max_rate = max_rate if max_rate is not None else rate * 2
+        self.increase = increase if increase is not None else rate / 20
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: float = None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        # hold every caller off for at least one interval at the new rate
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._next_slot = max(self._next_slot, time.monotonic() + pause)
+
+
+class LLMEngine:
+    """Runs evaluate-applicant requests concurrently under an AdaptiveRateLimiter."""
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 generate=generate_response):
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.generate = generate
+        self.limiter = None
+        self._slots = None
+
+    def _ensure_started(self):
+        # asyncio primitives must be created inside the running loop
+        if self.limiter is None:
+            self.limiter = AdaptiveRateLimiter(self.requests_per_minute / 60.0)
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def evaluate(self, applicant_id: str, payload_json: str) -> dict:
+        self._ensure_started()
+        cached = cache_lookup(applicant_id, payload_json)
+        if cached:
+            return cached
+        async with self._slots:
+            cb = breaker("gemini")
+            # transient errors follow the shared retry.gemini settings
+            s = settings("gemini")
+            attempt = quota_hits = 0
+            while True:
+                await self.limiter.acquire()
+                try:
+                    cb.before_call()
+                    text = await asyncio.to_thread(self.generate, payload_json)
+                except CircuitOpenError as e:
+                    # Gemini is failing for everyone: wait for the breaker's trial call, not a fresh attempt
+                    logger.warning(f"Waiting {e.retry_in:.0f}s for {applicant_id}: {str(e)}")
+                    await asyncio.sleep(e.retry_in)
+                    continue
+                except Exception as e:
+                    if is_quota_error(e):
+                        # the limiter handles quota; it is not an outage, so the breaker is left alone
+                        quota_hits += 1
+                        if quota_hits < MAX_QUOTA_RETRIES:
+                            self.limiter.on_throttle(retry_after(e))
+                            metrics.inc("llm_retries_total", reason="quota")
+                            logger.warning(f"Quota hit for {applicant_id}, slowing to {self.limiter.rate * 60:.1f} req/min")
+                            continue
+                    elif not is_transient(e):
+                        cb.record_success()
+                    else:
+                        cb.record_failure()
+                        attempt += 1
+                        if attempt < s["max_attempts"]:
+                            metrics.inc("llm_retries_total", reason="error")
+                            await asyncio.sleep(backoff(attempt, e, s["base_delay"], s["max_delay"]))
+                            continue
+                    logger.error(f"Evaluation failed for {applicant_id}: {str(e)}")
+                    return {"success": False, "error": str(e)}
+                cb.record_success()
+                self.limiter.on_success()
+                return parse_and_cache(applicant_id, payload_json, text)
+
+    async def evaluate_many(self, items):
+        """
+        Async generator over (applicant_id, payload_json) pairs that yields
+        (applicant_id, result) in completion order.
+        """
+        self._ensure_started()
+
+        async def run(applicant_id, payload_json):
+            return applicant_id, await self.evaluate(applicant_id, payload_json)
+
+        tasks = [asyncio.ensure_future(run(aid, payload)) for aid, payload in items]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class ThreadedEngine:
+    """
+    An LLMEngine running on its own event-loop thread, for callers that are
+    plain threads (run_pipeline.run_staged). evaluate() blocks the calling
+    thread; every caller shares the engine's limiter, retries and cache.
+    """
+    def __init__(self, **engine_kwargs):
+        self.engine = LLMEngine(**engine_kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-engine", daemon=True)
+        self._thread.start()
+
+    def evaluate(self, applicant_id: str, payload_json: str) -> dict:
+        return asyncio.run_coroutine_threadsafe(self.engine.evaluate(applicant_id, payload_json), self._loop).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def evaluate_batch(items, on_result=None, **engine_kwargs) -> dict:
+    """
+    Blocking wrapper around LLMEngine.evaluate_many. on_result(applicant_id, result)
+    is called as each result arrives; returns {applicant_id: result}.
+    """
+    async def run():
+        results = {}
+        async for applicant_id, result in LLMEngine(**engine_kwargs).evaluate_many(items):
+            results[applicant_id] = result
+            if on_result:
+                on_result(applicant_id, result)
+        return results
+
+    return asyncio.run(run())
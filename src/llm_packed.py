@@ -0,0 +1,141 @@
+import json
+import logging
+import re
+
+import metrics
+from config import section
+from llm import MODEL, evaluate_applicant, generate_text, get_result_cache
+from llm_cache import cache_key
+from projection import estimate_tokens
+from retries import retrying
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CONFIG = section("gemini")
+# prompt-side token budget per packed request (instructions + payloads)
+DEFAULT_TOKEN_BUDGET = GEMINI_CONFIG.get("pack_token_budget") or 6000
+DEFAULT_MAX_PER_PACK = GEMINI_CONFIG.get("pack_max_applicants") or 10
+OUTPUT_TOKENS_PER_APPLICANT = 400
+
+PACKED_PROMPT = """You are a recruiting analyst. You will receive several JSON applicant profiles, keyed by applicant_id. For EACH applicant, independently:
+1. Provide a concise 75-word summary.
+2. Rate overall candidate quality from 1-10 (higher is better).
+3. List any data gaps or inconsistencies you notice.
+4. Suggest up to three follow-up questions to clarify gaps.
+
+Return only a JSON object with one entry per applicant_id:
+{"<applicant_id>": {"summary": "<text>", "score": <integer>, "issues": ["<issue>", ...], "follow_ups": ["<question>", ...]}}
+"""
+# bump whenever PACKED_PROMPT changes
+PACKED_PROMPT_VERSION = "packed-1"
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def pack_items(items, token_budget: int = DEFAULT_TOKEN_BUDGET, max_per_pack: int = DEFAULT_MAX_PER_PACK):
+    """
+    Greedily groups (applicant_id, payload_json) pairs so each pack's prompt
+    stays within token_budget. A payload too big for any pack goes alone.
+    """
+    base = estimate_tokens(PACKED_PROMPT)
+    packs, current, used = [], [], base
+    for applicant_id, payload_json in items:
+        cost = estimate_tokens(payload_json) + estimate_tokens(applicant_id) + 2
+        if current and (used + cost > token_budget or len(current) >= max_per_pack):
+            packs.append(current)
+            current, used = [], base
+        current.append((applicant_id, payload_json))
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def build_packed_prompt(pack) -> str:
+    body = ",\n".join(f"{json.dumps(aid)}: {payload_json}" for aid, payload_json in pack)
+    return PACKED_PROMPT + "\nApplicants JSON:\n{" + body + "}"
+
+
+def _as_lines(value) -> list:
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if isinstance(value, str) and value.strip() and value.strip().lower() != "none":
+        return [value.strip()]
+    return []
+
+
+def _to_result(entry) -> dict:
+    """Maps one packed entry onto the evaluate_applicant result shape, or None if unusable."""
+    if not isinstance(entry, dict):
+        return None
+    summary = entry.get("summary")
+    try:
+        score = int(entry.get("score"))
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(summary, str) or not summary.strip() or not 1 <= score <= 10:
+        return None
+    issues = _as_lines(entry.get("issues"))
+    return {
+        "summary": summary.strip(),
+        "score": score,
+        "issues": ", ".join(issues) if issues else "None",
+        "follow_ups": "\n".join(f"* {q}" for q in _as_lines(entry.get("follow_ups"))),
+        "success": True,
+    }
+
+
+def parse_packed_response(text: str, applicant_ids) -> dict:
+    """Returns {applicant_id: result or None}; None marks an applicant that needs a solo retry."""
+    try:
+        data = json.loads(_FENCE.sub("", text.strip()))
+    except (json.JSONDecodeError, AttributeError):
+        data = None
+    if not isinstance(data, dict):
+        return {aid: None for aid in applicant_ids}
+    return {aid: _to_result(data.get(aid)) for aid in applicant_ids}
+
+
+@retrying("gemini")
+def call_llm_packed(pack) -> str:
+    return generate_text(build_packed_prompt(pack), OUTPUT_TOKENS_PER_APPLICANT * len(pack),
+                         response_mime_type="application/json")
+
+
+def evaluate_packed(items, token_budget: int = DEFAULT_TOKEN_BUDGET, max_per_pack: int = DEFAULT_MAX_PER_PACK) -> dict:
+    """
+    Evaluates many (applicant_id, payload_json) pairs with several applicants
+    per Gemini request. Applicants whose part of a response can't be parsed
+    are retried alone through evaluate_applicant. Returns {applicant_id: result}.
+    """
+    cache = get_result_cache()
+    results, misses = {}, []
+    for applicant_id, payload_json in items:
+        cached = cache.get(cache_key(payload_json, MODEL, PACKED_PROMPT_VERSION))
+        metrics.inc("llm_cache_lookups_total", result="hit" if cached else "miss")
+        if cached:
+            results[applicant_id] = cached
+        else:
+            misses.append((applicant_id, payload_json))
+
+    for pack in pack_items(misses, token_budget, max_per_pack):
+        ids = [aid for aid, _ in pack]
+        logger.info(f"Evaluating {len(pack)} applicants in one request")
+        metrics.inc("llm_packed_applicants_total", len(pack))
+        try:
+            parsed = parse_packed_response(call_llm_packed(pack), ids)
+        except Exception as e:
+            logger.error(f"Packed evaluation failed for {ids}: {str(e)}")
+            for aid in ids:
+                results[aid] = {"success": False, "error": str(e)}
+            continue
+        for applicant_id, payload_json in pack:
+            result = parsed.get(applicant_id)
+            if result is None:
+                logger.warning(f"Could not parse packed result for {applicant_id}, retrying alone")
+                metrics.inc("llm_pack_fallbacks_total")
+                result = evaluate_applicant(applicant_id, payload_json)
+            else:
+                cache.put(cache_key(payload_json, MODEL, PACKED_PROMPT_VERSION), result, applicant_id=applicant_id)
+            results[applicant_id] = result
+    return results
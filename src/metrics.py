@@ -0,0 +1,123 @@
+"""
+Process-wide counters and timers for the pipeline hot paths.
+
+Disabled unless PIPELINE_METRICS=1 (or enable() is called); every hook
+then returns after a single flag check. snapshot() gives a JSON-able dict
+and to_prometheus() the Prometheus text exposition format; dump() writes
+either, picked by file extension.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_enabled = os.environ.get('PIPELINE_METRICS', '').lower() in ('1', 'true', 'yes')
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def _key(name, labels):
+    # label values arrive as ints, None or strings for the same label; keep them sortable
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        t = _timings.get(key)
+        if t is None:
+            _timings[key] = [1, seconds, seconds]
+        else:
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+
+@contextmanager
+def _timed(name, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def timer(name: str, **labels):
+    """Context manager recording the block's duration under `name`."""
+    if not _enabled:
+        return nullcontext()
+    return _timed(name, labels)
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in sorted(_counters.items())]
+        timings = [{'name': n, 'labels': dict(l), 'count': t[0], 'sum': t[1], 'max': t[2]}
+                   for (n, l), t in sorted(_timings.items())]
+    return {'timestamp': time.time(), 'counters': counters, 'timings': timings}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items())
+    return '{' + body + '}'
+
+
+def to_prometheus() -> str:
+    snap = snapshot()
+    lines, typed = [], set()
+    for c in snap['counters']:
+        if c['name'] not in typed:
+            typed.add(c['name'])
+            lines.append(f"# TYPE {c['name']} counter")
+        lines.append(f"{c['name']}{_labels(c['labels'])} {c['value']}")
+    for t in snap['timings']:
+        if t['name'] not in typed:
+            typed.add(t['name'])
+            lines.append(f"# TYPE {t['name']} summary")
+        labels = _labels(t['labels'])
+        lines.append(f"{t['name']}_count{labels} {t['count']}")
+        lines.append(f"{t['name']}_sum{labels} {t['sum']:.6f}")
+        lines.append(f"{t['name']}_max{labels} {t['max']:.6f}")
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path: str):
+    """Writes Prometheus text for *.prom/*.txt paths and a JSON snapshot otherwise."""
+    text = to_prometheus() if path.endswith(('.prom', '.txt')) else json.dumps(snapshot(), indent=2)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def dump_at_exit(path: str):
+    enable()
+    atexit.register(dump, path)
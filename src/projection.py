@@ -0,0 +1,97 @@
+"""
+Projection of a compressed payload down to what the LLM prompt needs.
+
+project_for_llm() keeps a short list of fields, rewrites dates as YYYY-MM
+and salary fields as one rate string, and, when the result is still over
+the token budget, folds the oldest jobs into a one-line summary.
+"""
+import json
+import re
+from collections import namedtuple
+from config import section
+
+GEMINI_CONFIG = section('gemini')
+# estimated prompt tokens for one applicant's projected JSON
+DEFAULT_TOKEN_BUDGET = GEMINI_CONFIG.get('payload_token_budget') or 1200
+# free-text fields are cut to this many characters
+MAX_TEXT_CHARS = 300
+
+PERSONAL_FIELDS = {'Full Name': 'name', 'Location': 'location', 'LinkedIn': 'linkedin'}
+WORK_FIELDS = {'Company': 'company', 'Title': 'title', 'Technologies': 'tech', 'Description': 'description'}
+
+Projection = namedtuple('Projection', ['payload_json', 'tokens', 'summarized_jobs'])
+
+_DATE = re.compile(r'^(\d{4})-(\d{2})')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/JSON text
+    return len(text) // 4 + 1
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def _short_date(value):
+    m = _DATE.match(str(value)) if value else None
+    return f"{m.group(1)}-{m.group(2)}" if m else value
+
+def _text(value):
+    if isinstance(value, list):
+        value = ', '.join(str(v) for v in value)
+    if isinstance(value, str) and len(value) > MAX_TEXT_CHARS:
+        return value[:MAX_TEXT_CHARS - 3].rstrip() + '...'
+    return value
+
+def _number(value):
+    m = _NUMBER.search(str(value)) if value not in (None, '') else None
+    return m.group(0) if m else None
+
+def _rate(salary: dict):
+    preferred, minimum = _number(salary.get('Preferred Rate')), _number(salary.get('Minimum Rate'))
+    if not preferred and not minimum:
+        return None
+    span = f"{minimum}-{preferred}" if minimum and preferred and minimum != preferred else (preferred or minimum)
+    return f"{salary.get('Currency') or 'USD'} {span}/h"
+
+def _availability(value):
+    hours = _number(value)
+    return f"{hours}h/wk" if hours else _text(value)
+
+def _job(fields: dict) -> dict:
+    job = {short: _text(fields.get(name)) for name, short in WORK_FIELDS.items()}
+    start, end = _short_date(fields.get('Start')), _short_date(fields.get('End'))
+    if start or end:
+        job['dates'] = f"{start or '?'}..{end or 'now'}"
+    return {k: v for k, v in job.items() if v not in (None, '')}
+
+def _summarize(jobs) -> str:
+    companies = list(dict.fromkeys(j.get('company') or '?' for j in jobs))
+    starts = sorted(d[:7] for d in (j.get('dates', '') for j in jobs) if d[:1].isdigit())
+    span = f" since {starts[0][:4]}" if starts else ''
+    return f"{len(jobs)} earlier roles{span} at {', '.join(companies)}"
+
+def project_for_llm(payload, token_budget: int = DEFAULT_TOKEN_BUDGET) -> Projection:
+    """
+    Builds the LLM view of a compressed payload (dict or JSON string).
+    Jobs are listed newest first; if the JSON is over token_budget the
+    oldest ones are replaced by an 'earlier_roles' summary until it fits
+    (the newest job is always kept).
+    """
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    personal = payload.get('personal') or {}
+    salary = payload.get('salary') or {}
+    out = {'applicant_id': payload.get('applicant_id')}
+    out.update({short: personal.get(name) for name, short in PERSONAL_FIELDS.items()})
+    out['rate'] = _rate(salary)
+    out['availability'] = _availability(salary.get('Availability'))
+    out = {k: v for k, v in out.items() if v not in (None, '')}
+
+    history = payload.get('experience', payload.get('work')) or []
+    jobs = sorted((_job(w) for w in history), key=lambda j: j.get('dates', ''), reverse=True)
+    kept, folded = jobs, []
+    text = _dumps({**out, 'experience': kept})
+    while estimate_tokens(text) > token_budget and len(kept) > 1:
+        kept, folded = kept[:-1], kept[-1:] + folded
+        text = _dumps({**out, 'experience': kept, 'earlier_roles': _summarize(folded)})
+    return Projection(text, estimate_tokens(text), len(folded))
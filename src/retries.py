@@ -0,0 +1,177 @@
+"""
+Shared retry policy and circuit breakers for the Gemini and Airtable calls.
+
+Only transient failures (429, 408, 5xx, timeouts, dropped connections) are
+retried, after the server's Retry-After when it sends one, otherwise after
+exponential backoff with full jitter. Permanent failures (bad key, invalid
+request, malformed output) are raised at once. Each backend has a circuit
+breaker: after `failure_threshold` consecutive transient failures it opens
+and calls fail fast with CircuitOpenError for `reset_seconds`, then one
+trial call is let through.
+"""
+import email.utils
+import functools
+import random
+import threading
+import time
+from config import section
+import metrics
+
+RETRY_CONFIG = section('retry')
+DEFAULTS = {
+    'max_attempts': 5,
+    'base_delay': 1.0,
+    'max_delay': 60.0,
+    'failure_threshold': 5,
+    'reset_seconds': 60.0,
+}
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# exception class names that mean "try again" whatever library raised them
+TRANSIENT_NAMES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+    'DeadlineExceeded', 'GatewayTimeout', 'Aborted',
+    'Timeout', 'ReadTimeout', 'ConnectTimeout', 'ConnectionError', 'ChunkedEncodingError',
+}
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f'{backend} circuit open; next attempt in {retry_in:.0f}s')
+        self.backend = backend
+        self.retry_in = retry_in
+
+def _status(exc):
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        # google.api_core errors carry the HTTP status as .code
+        status = getattr(exc, 'code', None)
+    return status if isinstance(status, int) else None
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = _status(exc)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in TRANSIENT_NAMES
+
+def retry_after(exc: Exception):
+    """Seconds the server asked us to wait (Retry-After header), or None."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._trial):
+                metrics.inc('circuit_rejections_total', backend=self.name)
+                elapsed = time.monotonic() - self.opened_at
+                raise CircuitOpenError(self.name, max(1.0, self.reset_seconds - elapsed))
+            # half-open lets exactly one trial call through
+            self._trial = state == 'half-open'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    metrics.inc('circuit_opened_total', backend=self.name)
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+def settings(backend: str) -> dict:
+    return {**DEFAULTS, **(RETRY_CONFIG.get(backend) or {})}
+
+# module attribute so tests can skip the waiting
+sleep = time.sleep
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def reset():
+    """Forgets every breaker's state."""
+    with _breakers_lock:
+        _breakers.clear()
+
+def breaker(backend: str) -> CircuitBreaker:
+    """The process-wide breaker for a backend ('gemini', 'airtable')."""
+    with _breakers_lock:
+        if backend not in _breakers:
+            s = settings(backend)
+            _breakers[backend] = CircuitBreaker(backend, s['failure_threshold'], s['reset_seconds'])
+        return _breakers[backend]
+
+def backoff(attempt: int, exc: Exception, base_delay: float, max_delay: float) -> float:
+    server = retry_after(exc)
+    if server is not None:
+        return min(server, max_delay)
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+def call(backend: str, fn, *args, **kwargs):
+    """fn(*args, **kwargs) under the backend's retry policy and circuit breaker."""
+    s = settings(backend)
+    cb = breaker(backend)
+    for attempt in range(1, s['max_attempts'] + 1):
+        cb.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                # the backend answered; the request itself is at fault
+                cb.record_success()
+                raise
+            cb.record_failure()
+            if attempt == s['max_attempts']:
+                raise
+            reason = _status(e) or type(e).__name__
+            metrics.inc('retries_total', backend=backend, reason=reason)
+            sleep(backoff(attempt, e, s['base_delay'], s['max_delay']))
+            continue
+        cb.record_success()
+        return result
+
+def retrying(backend: str):
+    """Decorator form of call()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return call(backend, fn, *args, **kwargs)
+        return wrapper
+    return wrap
@@ -0,0 +1,128 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+from config import load_config
+
+# used when config.yaml has no shortlist section
+DEFAULT_RULES = {
+    'tier1_companies': ['Google', 'Meta', 'OpenAI', 'Microsoft', 'Amazon', 'Apple'],
+    'min_years_experience': 4,
+    'max_preferred_rate': 100,
+    'min_availability_hours': 20,
+    'allowed_locations': ['United States', 'Canada', 'United Kingdom', 'Germany', 'India'],
+}
+# sentinel for a missing or unparseable preferred rate (fails the rate rule)
+MISSING_RATE = 99999
+_DIGITS = re.compile(r'\d+')
+
+Verdict = namedtuple('Verdict', ['applicant_id', 'ok', 'reason'])
+
+class CompiledRules:
+    """Shortlist thresholds from config.yaml, normalised once for evaluate_batch."""
+    def __init__(self, tier1_companies, min_years_experience, max_preferred_rate,
+                 min_availability_hours, allowed_locations):
+        self.tier1 = np.array(sorted(tier1_companies), dtype=str)
+        self.min_years = min_years_experience
+        self.max_rate = max_preferred_rate
+        self.min_hours = min_availability_hours
+        self.locations = list(allowed_locations)
+
+def load_rules(config=None):
+    """Compiled rules for a config dict; without one, config.yaml's, compiled once per process."""
+    if config is None:
+        return _configured_rules()
+    section = config.get('shortlist') or {}
+    return CompiledRules(**{**DEFAULT_RULES, **section})
+
+@lru_cache(maxsize=None)
+def _configured_rules():
+    return load_rules(load_config())
+
+def _field(d, *names):
+    for n in names:
+        v = d.get(n)
+        if v:
+            return v
+    return None
+
+def _year(value, default=None):
+    if not value:
+        return default
+    try:
+        return int(str(value)[:4])
+    except ValueError:
+        return None
+
+def _rate(value):
+    try:
+        return int(value) if value is not None else MISSING_RATE
+    except (ValueError, TypeError):
+        return MISSING_RATE
+
+def _hours(value):
+    m = _DIGITS.search(value) if isinstance(value, str) else None
+    return int(m.group(0)) if m else 0
+
+def to_columns(payloads):
+    """
+    Flattens compressed payloads into column arrays: one row per applicant,
+    plus one row per work entry tagged with its owner's position.
+    """
+    this_year = datetime.now().year
+    owners, starts, ends, companies = [], [], [], []
+    rates, hours, locations, ids = [], [], [], []
+    for i, p in enumerate(payloads):
+        ids.append(p.get('applicant_id'))
+        for w in p.get('experience') or []:
+            owners.append(i)
+            starts.append(_year(_field(w, 'Start', 'start')))
+            ends.append(_year(_field(w, 'End', 'end'), this_year))
+            companies.append(_field(w, 'company', 'Company') or '')
+        salary = p.get('salary') or {}
+        rates.append(_rate(_field(salary, 'preferred_rate', 'Preferred Rate')))
+        hours.append(_hours(_field(salary, 'availability_hours_per_week', 'Availability')))
+        personal = p.get('personal') or {}
+        locations.append(_field(personal, 'location', 'Location') or '')
+    return {
+        'applicant_id': ids,
+        'owner': np.array(owners, dtype=np.int64),
+        'start': np.array([np.nan if s is None else s for s in starts], dtype=float),
+        'end': np.array([np.nan if e is None else e for e in ends], dtype=float),
+        'company': np.array(companies, dtype=str),
+        'rate': np.array(rates, dtype=np.int64),
+        'hours': np.array(hours, dtype=np.int64),
+        'location': np.array(locations, dtype=str),
+    }
+
+def evaluate_columns(cols, rules):
+    n = len(cols['applicant_id'])
+    owner = cols['owner']
+    # entries without a parseable start (or end) year contribute nothing
+    span = np.nan_to_num(np.clip(cols['end'] - cols['start'], 0, None), nan=0.0)
+    years = np.bincount(owner, weights=span, minlength=n).astype(np.int64)
+    tier1_hits = np.isin(cols['company'], rules.tier1) if len(owner) else np.zeros(0, dtype=bool)
+    tier1 = np.bincount(owner, weights=tier1_hits, minlength=n) > 0
+    location_ok = np.zeros(n, dtype=bool)
+    for loc in rules.locations:
+        location_ok |= np.char.find(cols['location'], loc) >= 0
+    exp_ok = (years >= rules.min_years) | tier1
+    comp_ok = (cols['rate'] <= rules.max_rate) & (cols['hours'] >= rules.min_hours)
+    ok = exp_ok & comp_ok & location_ok
+    return {'years': years, 'tier1': tier1, 'location_ok': location_ok, 'ok': ok}
+
+def evaluate_batch(payloads, rules=None):
+    """Pure shortlist verdicts for a list of compressed payloads, in input order."""
+    rules = rules or load_rules()
+    payloads = list(payloads)
+    if not payloads:
+        return []
+    cols = to_columns(payloads)
+    out = evaluate_columns(cols, rules)
+    verdicts = []
+    for i, aid in enumerate(cols['applicant_id']):
+        reason = (f"exp:{int(out['years'][i])}, tier1:{bool(out['tier1'][i])}, pref:{int(cols['rate'][i])}, "
+                  f"avail:{int(cols['hours'][i])}, location_ok:{bool(out['location_ok'][i])}")
+        verdicts.append(Verdict(aid, bool(out['ok'][i]), reason))
+    return verdicts
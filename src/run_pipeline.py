@@ -1,68 +1,311 @@
 import os 
-from compress import build_compressed_json
+import queue as queue_mod
+import socket
+import threading
+from collections import namedtuple
+from compress import build_compressed_json, build_index
 from shortlist import evaluate_shortlist
-from llm import call_llm_for_application, format_followups
-from airtable_utils import update_record, find_by_field
-import json
+from llm import evaluate_streaming, format_followups
+from llm_engine import ThreadedEngine
+from projection import project_for_llm
+from airtable_utils import update_record, find_by_field, write_buffer, unit_of_work, WriteBuffer, use_buffer
+from config import section
+from retries import CircuitOpenError
+import metrics
 
-def run_for_applicant(applicant_id):
-    print('Building compressed JSON...')
-    payload = build_compressed_json(applicant_id)
+PIPELINE_CONFIG = section('pipeline')
 
-    # write compressed JSON back to Applicants record
-    rows = find_by_field('applicants', 'Applicant ID', applicant_id)
-    if rows:
-        rec = rows[0]
-        update_record('applicants', rec['id'], {'Compressed JSON':json.dumps(payload)})
+def run_for_applicant(applicant_id, index=None):
+    # reads are memoised for the run; all Airtable writes are merged and sent in batch calls
+    with unit_of_work() as uow, write_buffer():
+        print('Building compressed JSON...')
+        with metrics.timer('stage_seconds', stage='compress'):
+            # also writes Compressed JSON back to the Applicants record
+            payload = build_compressed_json(applicant_id, index=index)
 
-    # evaluate shortlist
-    ok, reason = evaluate_shortlist(payload)
-    print('Shortlist:', ok, reason)
+            entry = index.get(applicant_id) if index is not None else None
+            rows = [entry['applicant']] if entry else find_by_field('applicants', 'Applicant ID', applicant_id)
 
-    # call LLM if compressed JSON present
+        # evaluate shortlist
+        with metrics.timer('stage_seconds', stage='shortlist'):
+            ok, reason = evaluate_shortlist(payload, index=index)
+        print('Shortlist:', ok, reason)
+
+        # call LLM if compressed JSON present
+        try:
+            # only the fields the prompt needs, within the token budget
+            projection = project_for_llm(payload)
+            print(f'LLM payload: ~{projection.tokens} tokens')
+            metrics.inc('llm_payload_tokens_total', projection.tokens)
+            with metrics.timer('stage_seconds', stage='llm'):
+                # sections are parsed while the response streams in
+                result = evaluate_streaming(projection.payload_json, applicant_id=applicant_id,
+                                            on_score=lambda s: print('LLM score:', s))
+            if not result['success']:
+                raise ValueError('LLM response has no Summary section')
+
+            # format follow-ups using helper from llm.py
+            followups = format_followups(result['follow_ups'])
+
+            if rows:
+                update_record('applicants', rows[0]['id'], {
+                    'LLM Summary': result['summary'],
+                    'LLM Score': result['score'],
+                    'LLM Follow Ups': followups
+                })
+            print('LLM text saved.')
+            metrics.inc('applicants_processed_total', status='ok')
+
+        except Exception as e:
+            print('LLM call failed:', e)
+            metrics.inc('applicants_processed_total', status='llm_failed')
+            # compress/shortlist writes still flush; the run fails so run_batch reports it
+            # and a worker retries the job instead of marking it done without LLM fields
+            raise
+        finally:
+            print(f'Airtable reads saved this run: {uow.saved}')
+
+def read_ids_file(path):
+    # one Applicant ID per line; blank lines and '#' comments are skipped
+    with open(path) as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.startswith('#')]
+
+def run_batch(applicant_ids=None):
+    """
+    Runs the pipeline for many applicants off a single prefetch of every table.
+    With applicant_ids=None every applicant in the base is processed.
+    Returns {applicant_id: error message or None}.
+    """
+    print('Prefetching tables...')
+    # for an ID list only those applicants' rows are read, not the whole base
+    index = build_index(applicant_ids=applicant_ids)
+    ids = list(index) if applicant_ids is None else applicant_ids
+    print(f'Processing {len(ids)} applicants')
+    results = {}
+    # one buffer across applicants so writes fill whole 10-record batches
+    with write_buffer(auto_flush=100):
+        for aid in ids:
+            try:
+                run_for_applicant(aid, index=index)
+                results[aid] = None
+            except Exception as e:
+                print(f'Applicant {aid} failed:', e)
+                results[aid] = str(e)
+    return results
+
+Stage = namedtuple('Stage', ['name', 'fn', 'workers'])
+_DONE = object()
+
+def run_stages(items, stages, queue_size: int = 50):
+    """
+    Runs (applicant_id, value) items through stages concurrently: each stage
+    has its own worker threads and hands fn(applicant_id, value) to the next
+    stage over a bounded queue, so a slow stage holds the others back instead
+    of letting work pile up in memory. Returns {applicant_id: error message
+    or None}; an item whose stage raises is dropped there.
+    """
+    queues = [queue_mod.Queue(maxsize=queue_size) for _ in stages]
+    results, lock = {}, threading.Lock()
+    remaining = [s.workers for s in stages]
+
+    def work(i):
+        stage, inbox = stages[i], queues[i]
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            aid, value = item
+            try:
+                with metrics.timer('stage_seconds', stage=stage.name):
+                    value = stage.fn(aid, value)
+            except Exception as e:
+                print(f'Applicant {aid} failed in {stage.name}:', e)
+                with lock:
+                    results[aid] = str(e)
+                continue
+            if outbox is not None:
+                outbox.put((aid, value))
+            else:
+                with lock:
+                    results[aid] = None
+        with lock:
+            remaining[i] -= 1
+            last = remaining[i] == 0
+        # the last worker out tells every worker of the next stage to stop
+        if last and outbox is not None:
+            for _ in range(stages[i + 1].workers):
+                outbox.put(_DONE)
+
+    threads = [threading.Thread(target=work, args=(i,), name=f'{s.name}-{n}', daemon=True)
+               for i, s in enumerate(stages) for n in range(s.workers)]
+    for t in threads:
+        t.start()
+    for item in items:
+        queues[0].put(item)
+    for _ in range(stages[0].workers):
+        queues[0].put(_DONE)
+    for t in threads:
+        t.join()
+    return results
+
+def run_staged(applicant_ids=None, workers=None, queue_size=None, requests_per_minute=None):
+    """
+    run_batch with the stages overlapped: compress, shortlist, LLM and
+    write-back run in their own threads (worker counts from
+    pipeline.stage_workers), so Airtable writes proceed while Gemini calls
+    are in flight. Each applicant's writes travel with it and are merged into
+    one buffer by the write-back stage, which flushes it in batch calls.
+    Gemini calls go through one llm_engine.ThreadedEngine, so they share its
+    adaptive rate limiter and the result cache.
+    Returns {applicant_id: error message or None}.
+    """
+    workers = {**{'compress': 1, 'shortlist': 1, 'llm': 4, 'writeback': 1},
+               **(PIPELINE_CONFIG.get('stage_workers') or {}), **(workers or {})}
+    queue_size = queue_size or PIPELINE_CONFIG.get('queue_size') or 50
+    flush_every = PIPELINE_CONFIG.get('flush_every') or 100
+    # LLM workers share one engine, so its adaptive limiter and the result cache cover them all
+    rpm = requests_per_minute or section('gemini').get('requests_per_minute') or 15
+
+    print('Prefetching tables...')
+    # for an ID list only those applicants' rows are read, not the whole base
+    index = build_index(applicant_ids=applicant_ids)
+    ids = list(index) if applicant_ids is None else applicant_ids
+    print(f'Processing {len(ids)} applicants in stages {workers}')
+    # a failed auto-flush keeps its writes for the next one instead of failing the applicant that tripped it
+    buf = WriteBuffer(auto_flush=flush_every)
+
+    def compress(aid, _):
+        pending = WriteBuffer()
+        with use_buffer(pending):
+            return build_compressed_json(aid, index=index), pending
+
+    def shortlist(aid, value):
+        payload, pending = value
+        with use_buffer(pending):
+            ok, reason = evaluate_shortlist(payload, index=index)
+        print(f'Shortlist {aid}:', ok, reason)
+        return value
+
+    def llm(aid, value):
+        payload, pending = value
+        projection = project_for_llm(payload)
+        metrics.inc('llm_payload_tokens_total', projection.tokens)
+        result = engine.evaluate(aid, projection.payload_json)
+        if not result['success']:
+            print(f'LLM call failed for {aid}:', result.get('error'))
+            metrics.inc('applicants_processed_total', status='llm_failed')
+            # as in run_for_applicant: compress/shortlist writes are kept, the applicant is failed
+            buf.merge(pending)
+            raise ValueError(result.get('error') or 'LLM response has no Summary section')
+        return result, pending
+
+    def writeback(aid, value):
+        result, pending = value
+        buf.merge(pending)
+        buf.update('applicants', index[aid]['applicant']['id'], {
+            'LLM Summary': result['summary'],
+            'LLM Score': result['score'],
+            'LLM Follow Ups': format_followups(result['follow_ups'])
+        })
+        metrics.inc('applicants_processed_total', status='ok')
+
+    stages = [Stage('compress', compress, workers['compress']),
+              Stage('shortlist', shortlist, workers['shortlist']),
+              Stage('llm', llm, workers['llm']),
+              Stage('writeback', writeback, workers['writeback'])]
+    engine = ThreadedEngine(concurrency=workers['llm'], requests_per_minute=rpm)
     try:
-        payload_json_string = json.dumps(payload)
-        llm_text = call_llm_for_application(payload_json_string)
-
-        # parse minimal fields and write back
-        summary = ''
-        score = None
-        followups_raw = []
-        collecting_followups = False
-
-        for ln in llm_text.splitlines():
-            if ln.startswith('Summary:'):
-                summary = ln.split('Summary:')[1].strip()
-            elif ln.startswith('Score:'):
-                try:
-                    score = int(ln.split('Score:')[1].strip())
-                except:
-                    score = None
-            elif ln.startswith('Follow-Ups:'):
-                collecting_followups = True
-            elif collecting_followups:
-                # stop collecting if blank line or another section starts
-                if not ln.strip() or ln.endswith(':'):
-                    break
-                followups_raw.append(ln)
-
-        # format follow-ups using helper from llm.py
-        followups = format_followups("\n".join(followups_raw))
-
-        if rows:
-            update_record('applicants', rows[0]['id'], {
-                'LLM Summary': summary,
-                'LLM Score': score or 0,
-                'LLM Follow Ups': followups
-            })
-        print('LLM text saved.')
-
-    except Exception as e:
-        print('LLM call failed:', e)
+        return run_stages(((aid, None) for aid in ids), stages, queue_size)
+    finally:
+        engine.close()
+        buf.flush()
+
+def run_worker(queue=None, worker_id=None, drain=False, poll_seconds=None, stop=None):
+    """
+    Long-running worker: claims Applicant IDs from the local job queue and
+    runs the pipeline for each, keeping this process's Airtable/Gemini
+    clients and caches warm between jobs. Start more processes against the
+    same queue file to scale out. With drain=True it exits once the queue is
+    empty. Returns the number of jobs handled.
+    """
+    from jobqueue import JobQueue, QUEUE_CONFIG
+    queue = queue or JobQueue()
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    poll = poll_seconds if poll_seconds is not None else QUEUE_CONFIG.get('poll_seconds') or 2
+    stop = stop or threading.Event()
+    def requeue_stale():
+        requeued = queue.requeue_stale()
+        if requeued:
+            print(f'Requeued {requeued} jobs left running by a dead worker')
+
+    requeue_stale()
+    handled = 0
+    while not stop.is_set():
+        job = queue.claim(worker_id)
+        if job is None:
+            if drain:
+                break
+            # other workers may have died since we started; don't leave their jobs running forever
+            requeue_stale()
+            stop.wait(poll)
+            continue
+        print(f"[{worker_id}] job {job['id']}: applicant {job['applicant_id']} (attempt {job['attempts']})")
+        try:
+            run_for_applicant(job['applicant_id'])
+            queue.complete(job['id'])
+            metrics.inc('jobs_total', state='done')
+        except CircuitOpenError as e:
+            # the backend is down, not the job: put it back and wait instead of failing the queue
+            print(f"Job {job['id']} deferred:", e)
+            queue.defer(job['id'], e.retry_in)
+            metrics.inc('jobs_total', state='deferred')
+            stop.wait(e.retry_in)
+            continue
+        except Exception as e:
+            print(f"Job {job['id']} failed:", e)
+            queue.fail(job['id'], str(e))
+            metrics.inc('jobs_total', state='failed')
+        handled += 1
+    return handled
 
 if __name__ == '__main__':
-    import sys
-    if len(sys.argv) < 2:
-        print('Provide Applicant ID as arg')
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the applicant pipeline')
+    parser.add_argument('applicant_id', nargs='?', help='single Applicant ID to process')
+    parser.add_argument('--all', action='store_true', help='process every applicant in the base')
+    parser.add_argument('--ids-file', help='file with one Applicant ID per line')
+    parser.add_argument('--changed', action='store_true', help='only applicants changed since the last --changed run')
+    parser.add_argument('--staged', action='store_true', help='with --all/--ids-file/--changed, overlap the stages in threads')
+    parser.add_argument('--metrics-out', help='write metrics at exit (.prom/.txt for Prometheus text, else JSON)')
+    parser.add_argument('--enqueue', action='store_true', help='queue the given applicant_id / --ids-file ids for workers')
+    parser.add_argument('--worker', action='store_true', help='run as a long-lived worker on the local job queue')
+    parser.add_argument('--drain', action='store_true', help='with --worker, exit once the queue is empty')
+    parser.add_argument('--queue-status', action='store_true', help='print job counts per state')
+    args = parser.parse_args()
+    if args.metrics_out:
+        metrics.dump_at_exit(args.metrics_out)
+    if args.enqueue or args.queue_status:
+        from jobqueue import JobQueue
+        queue = JobQueue()
+        ids = read_ids_file(args.ids_file) if args.ids_file else [args.applicant_id] if args.applicant_id else []
+        for aid in ids if args.enqueue else []:
+            queue.enqueue(aid)
+        print(queue.counts())
+    elif args.worker:
+        import signal
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        run_worker(drain=args.drain, stop=stop)
+    elif args.changed:
+        from sync import run_incremental
+        run_incremental(run_staged if args.staged else run_batch)
+    elif args.all:
+        (run_staged if args.staged else run_batch)()
+    elif args.ids_file:
+        (run_staged if args.staged else run_batch)(read_ids_file(args.ids_file))
+    elif args.applicant_id:
+        run_for_applicant(args.applicant_id)
     else:
-        run_for_applicant(sys.argv[1])
+        print('Provide Applicant ID as arg, or use --all / --ids-file / --changed')
@@ -1,65 +1,40 @@
 import json
-from datetime import datetime
+import codec
 from airtable_utils import create_record, update_record, find_by_field
-import re
+from rules import evaluate_batch, load_rules
 
-TIER1 = {'Google', 'Meta', 'OpenAI', 'Microsoft', 'Amazon', 'Apple'}
-
-def years_experience_from_work(experience_list):
-    total = 0
-    for w in experience_list:
-        s = w.get('Start') or w.get('start')
-        e = w.get('End') or w.get('end')
-        try:
-            if s:
-                sy = int(str(s)[:4])
-                ey = int(str(e)[:4]) if e else datetime.now().year
-                total += max(0, ey - sy)
-        except (ValueError, IndexError):
-            pass
-    return total
-
-def evaluate_shortlist(payload_json):
-    payload = payload_json
+def _parse_payload(payload_json):
     if isinstance(payload_json, str):
-        try:
-            payload = json.loads(payload_json)
-        except json.JSONDecodeError:
-            print("Error: Invalid JSON payload provided.")
-            return False, "Invalid JSON payload"
+        return codec.decode(payload_json)
+    return payload_json
 
-    aid = payload.get('applicant_id')
-    exp = payload.get('experience', [])
-    total_years = years_experience_from_work(exp)
-    worked_tier1 = any((w.get('company') or w.get('Company')) in TIER1 for w in exp)
-    
-    salary = payload.get('salary', {})
-    
-    pref_str = salary.get('preferred_rate') or salary.get('Preferred Rate')
-    avail_str = salary.get('availability_hours_per_week') or salary.get('Availability')
-    
+def evaluate_shortlist(payload_json, index=None, rules=None):
     try:
-        pref = int(pref_str) if pref_str is not None else 99999
-        avail_match = re.search(r'\d+', avail_str)
-        avail = int(avail_match.group(0)) if avail_match else 0
-    except (ValueError, TypeError):
-        pref = 99999
-        avail = 0
-        
-    personal = payload.get('personal', {})
-    location = personal.get('location') or personal.get('Location', '')
-    location_ok = any(x in location for x in [
-        'United States', 'Canada', 'United Kingdom', 'Germany', 'India'
-    ])
-    
-    exp_ok = (total_years >= 4) or worked_tier1
-    comp_ok = (pref <= 100) and (avail >= 20)
-    all_ok = exp_ok and comp_ok and location_ok
-    
-    reason = f"exp:{total_years}, tier1:{worked_tier1}, pref:{pref}, avail:{avail}, location_ok:{location_ok}"
-    
+        payload = _parse_payload(payload_json)
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON payload provided.")
+        return False, "Invalid JSON payload"
+
+    verdict = evaluate_batch([payload], rules)[0]
+    return write_shortlist(payload_json, verdict.ok, verdict.reason, index=index)
+
+def shortlist_batch(payloads, index=None, rules=None):
+    """
+    Scores many payloads in one vectorised pass (rules loaded once), then
+    writes each verdict back. Returns the list of rules.Verdict.
+    """
+    payloads = [_parse_payload(p) for p in payloads]
+    verdicts = evaluate_batch(payloads, rules or load_rules())
+    for payload, verdict in zip(payloads, verdicts):
+        write_shortlist(payload, verdict.ok, verdict.reason, index=index)
+    return verdicts
+
+def write_shortlist(payload_json, all_ok, reason, index=None):
+    """Airtable side of shortlisting: Shortlisted Leads row and Applicants status."""
+    aid = _parse_payload(payload_json).get('applicant_id')
     try:
-        rows = find_by_field('applicants', 'Applicant ID', aid)
+        entry = index.get(aid) if index is not None else None
+        rows = [entry['applicant']] if entry else find_by_field('applicants', 'Applicant ID', aid)
         if not rows:
             print(f"⚠️ No applicant found with ID {aid}")
             return False, "Applicant not found"
@@ -69,11 +44,11 @@ def evaluate_shortlist(payload_json):
         if all_ok:
             # ✅ Passed qualifications
             print("Attempting to create a new record in Shortlisted Leads...")
-            existing_shortlist = find_by_field('shortlisted', 'Applicant', aid)
+            existing_shortlist = entry['shortlisted'] if entry else find_by_field('shortlisted', 'Applicant', aid)
             if not existing_shortlist:
                 create_record('shortlisted', {
                     'Applicant': [applicant_record_id],
-                    'Compressed JSON': json.dumps(payload_json, default=str),
+                    'Compressed JSON': codec.encode(_parse_payload(payload_json)),
                     'Score Reason': reason
                 })
                 print("Successfully created a new record in Shortlisted Leads.")
@@ -94,7 +69,7 @@ def evaluate_shortlist(payload_json):
     return all_ok, reason
 
 def find_applicant_record_id(applicant_id):
-    rows = find_by_field('applicants', 'Applicant ID', applicant_id)
+    rows = find_by_field('applicants', 'Applicant ID', applicant_id, fields=['Applicant ID'])
     return rows[0]['id'] if rows else None
 
 if __name__ == '__main__':
@@ -0,0 +1,128 @@
+"""
+Local snapshot of every table in config.yaml, for offline replays.
+
+Each table is stored as <table_key>.jsonl (one record per line) next to
+<table_key>.idx.json mapping record id -> [offset, length], plus a
+manifest.json. Snapshot reads the files through mmap, so replays load
+rows straight from the page cache.
+
+    python src/snapshot.py export            # one full read of the base
+    python src/snapshot.py replay            # compress + shortlist, no API calls
+"""
+import json
+import mmap
+import os
+import time
+from datetime import datetime, timezone
+from airtable_utils import CONFIG, WriteBuffer, fetch_all_records, use_buffer
+from config import section
+
+SNAPSHOT_PATH = section('snapshot').get('path') or '.cache/snapshot'
+
+def export_snapshot(path: str = SNAPSHOT_PATH, tables=None) -> dict:
+    """Reads each table once and writes it to `path`; returns {table_key: rows}."""
+    os.makedirs(path, exist_ok=True)
+    counts = {}
+    for table_key in tables or CONFIG['airtable']['tables']:
+        offsets = {}
+        tmp = os.path.join(path, f'{table_key}.jsonl.tmp')
+        with open(tmp, 'wb') as f:
+            for rec in fetch_all_records(table_key):
+                line = json.dumps(rec, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+                offsets[rec['id']] = [f.tell(), len(line) - 1]
+                f.write(line)
+        os.replace(tmp, os.path.join(path, f'{table_key}.jsonl'))
+        with open(os.path.join(path, f'{table_key}.idx.json'), 'w') as f:
+            json.dump(offsets, f, separators=(',', ':'))
+        counts[table_key] = len(offsets)
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump({'created_at': datetime.now(timezone.utc).isoformat(),
+                   'base_id': CONFIG['airtable'].get('base_id'), 'tables': counts}, f, indent=2)
+    return counts
+
+class Snapshot:
+    """Read-only view of an exported snapshot directory."""
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._maps = {}
+        self._offsets = {}
+
+    def _map(self, table_key: str):
+        if table_key not in self._maps:
+            with open(os.path.join(self.path, f'{table_key}.jsonl'), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap refuses empty files
+                self._maps[table_key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        return self._maps[table_key]
+
+    def records(self, table_key: str) -> list:
+        """Every record of the table, in the shape fetch_all_records returns."""
+        data = self._map(table_key)
+        rows, pos = [], 0
+        while pos < len(data):
+            end = data.find(b'\n', pos)
+            rows.append(json.loads(data[pos:end]))
+            pos = end + 1
+        return rows
+
+    def get(self, table_key: str, record_id: str):
+        """One record by id via the offset index, or None."""
+        if table_key not in self._offsets:
+            with open(os.path.join(self.path, f'{table_key}.idx.json')) as f:
+                self._offsets[table_key] = json.load(f)
+        span = self._offsets[table_key].get(record_id)
+        if span is None:
+            return None
+        offset, length = span
+        return json.loads(self._map(table_key)[offset:offset + length])
+
+    def close(self):
+        for m in self._maps.values():
+            if m:
+                m.close()
+        self._maps.clear()
+
+def replay(snapshot: Snapshot, rules=None) -> dict:
+    """
+    Runs compress and shortlist over every applicant in the snapshot with
+    the current compressor and shortlist rules. Writes are collected but
+    never sent, so no API calls are made. Returns a summary dict.
+    """
+    from compress import build_compressed_json, build_index
+    from shortlist import shortlist_batch
+    started = time.perf_counter()
+    index = build_index(snapshot=snapshot)
+    discarded = WriteBuffer()
+    with use_buffer(discarded):
+        payloads = [build_compressed_json(aid, index=index) for aid in index]
+        verdicts = shortlist_batch(payloads, index=index, rules=rules)
+    return {
+        'applicants': len(payloads),
+        'shortlisted': sum(1 for v in verdicts if v.ok),
+        'verdicts': verdicts,
+        'writes_skipped': len(discarded),
+        'seconds': time.perf_counter() - started,
+    }
+
+if __name__ == '__main__':
+    import argparse
+    import contextlib
+    import io
+    parser = argparse.ArgumentParser(description='Export or replay a local snapshot of the base')
+    parser.add_argument('command', choices=['export', 'replay'])
+    parser.add_argument('--path', default=SNAPSHOT_PATH, help='snapshot directory')
+    args = parser.parse_args()
+    if args.command == 'export':
+        for table_key, n in export_snapshot(args.path).items():
+            print(f'{table_key}: {n} records')
+        print(f'Snapshot written to {args.path}')
+    else:
+        snap = Snapshot(args.path)
+        # per-applicant shortlist messages would drown the summary
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = replay(snap)
+        print(f"Replayed {summary['applicants']} applicants from the snapshot taken "
+              f"{snap.manifest['created_at']} in {summary['seconds']:.2f}s: "
+              f"{summary['shortlisted']} shortlisted, {summary['writes_skipped']} writes not sent")
@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from airtable_utils import fetch_all_records, get_records
+from config import section
+
+SYNC_CONFIG = section('sync')
+WATERMARK_PATH = SYNC_CONFIG.get('watermark_path') or '.cache/sync_watermark.json'
+# Airtable timestamps and our clock can disagree a little; re-read this much overlap
+CLOCK_SKEW = timedelta(seconds=SYNC_CONFIG.get('clock_skew_seconds', 60))
+# child tables and the link field pointing back at Applicants
+CHILD_TABLES = {'personal': 'Applicant ID', 'work': 'Applicant ID', 'salary': 'Applicant ID'}
+
+def load_watermark(path: str = WATERMARK_PATH):
+    """Returns {'since': iso timestamp or None, 'pending': [ids that failed last run]}."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'since': None, 'pending': []}
+
+def save_watermark(since: str, pending=(), path: str = WATERMARK_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'since': since, 'pending': sorted(pending)}, f)
+    os.replace(tmp, path)
+
+def _after(expr: str, since: str) -> str:
+    return f"IS_AFTER({expr}, DATETIME_PARSE('{since}'))"
+
+def _modified_formula(fields, since: str) -> str:
+    args = ', '.join('{' + f + '}' for f in fields)
+    return _after(f"LAST_MODIFIED_TIME({args})", since)
+
+def changed_applicant_ids(since: str):
+    """
+    Applicant IDs with a new Applicants row or any Personal Details, Work
+    Experience or Salary Preferences row modified after `since`.
+    The pipeline writes back to Applicants itself, so there only creation
+    time and the fields listed in sync.applicant_fields are watched.
+    """
+    changed = set()
+    applicant_formula = _after('CREATED_TIME()', since)
+    if SYNC_CONFIG.get('applicant_fields'):
+        applicant_formula = f"OR({applicant_formula}, {_modified_formula(SYNC_CONFIG['applicant_fields'], since)})"
+    for rec in fetch_all_records('applicants', applicant_formula):
+        changed.add(rec['fields'].get('Applicant ID') or rec['id'])
+    linked_ids = set()
+    for table_key, link_field in CHILD_TABLES.items():
+        for rec in fetch_all_records(table_key, _after('LAST_MODIFIED_TIME()', since)):
+            linked = rec['fields'].get(link_field) or []
+            linked_ids.update(linked if isinstance(linked, list) else [linked])
+    # child rows link to the Applicants record id; report its Applicant ID, as build_index and the webhook do
+    for rid, rec in get_records('applicants', linked_ids, fields=['Applicant ID']).items():
+        changed.add(rec['fields'].get('Applicant ID') or rid)
+    return changed
+
+def run_incremental(run_batch, path: str = WATERMARK_PATH):
+    """
+    Runs run_batch over applicants changed since the stored watermark (all
+    applicants on the first run), then advances the watermark. Applicants
+    that failed are carried over and retried next time.
+    """
+    state = load_watermark(path)
+    started = (datetime.now(timezone.utc) - CLOCK_SKEW).isoformat()
+    if state.get('since'):
+        ids = sorted(changed_applicant_ids(state['since']) | set(state.get('pending') or []))
+        print(f"{len(ids)} applicants changed since {state['since']}")
+        results = run_batch(ids) if ids else {}
+    else:
+        print('No watermark yet, processing every applicant')
+        results = run_batch()
+    failed = [aid for aid, err in results.items() if err]
+    save_watermark(started, failed, path)
+    return results
@@ -0,0 +1,242 @@
+"""
+HTTP receiver for Airtable webhook notifications.
+
+Airtable only pings the notification URL; the receiver then reads the new
+webhook payloads, maps every changed record back to its Applicant ID and
+enqueues one pipeline run per applicant on the local job queue. Each
+further change for an applicant still waiting in the queue pushes its run
+back by webhook.debounce_seconds (up to webhook.max_wait_seconds), so a
+burst of edits ends in a single run. Workers (run_pipeline.py --worker)
+pick the jobs up.
+
+    python src/webhook.py                    # listen on webhook.host:webhook.port
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from airtable_utils import CONFIG, get_api, get_record, unit_of_work
+from config import section
+from sync import CHILD_TABLES, SYNC_CONFIG
+
+WEBHOOK_CONFIG = section('webhook')
+DEBOUNCE_SECONDS = WEBHOOK_CONFIG.get('debounce_seconds') or 30
+MAX_WAIT_SECONDS = WEBHOOK_CONFIG.get('max_wait_seconds') or 300
+CURSOR_PATH = WEBHOOK_CONFIG.get('cursor_path') or '.cache/webhook_cursor.json'
+
+def changes_from_payload(payload: dict, table_keys: dict, field_names: dict):
+    """
+    Flattens one Airtable webhook payload into (table_key, record_id,
+    changed field names, created) tuples. Tables not in config.yaml are
+    skipped; so are destroyed records, which can no longer be linked to an
+    applicant.
+    """
+    out = []
+    for table_id, change in (payload.get('changedTablesById') or {}).items():
+        table_key = table_keys.get(table_id)
+        if table_key is None:
+            continue
+        for record_id, rec in (change.get('createdRecordsById') or {}).items():
+            fields = {field_names.get(f, f) for f in rec.get('cellValuesByFieldId') or {}}
+            out.append((table_key, record_id, fields, True))
+        for record_id, rec in (change.get('changedRecordsById') or {}).items():
+            cells = (rec.get('current') or {}).get('cellValuesByFieldId') or {}
+            out.append((table_key, record_id, {field_names.get(f, f) for f in cells}, False))
+    return out
+
+def _applicant_id(applicant_record_id: str):
+    rec = get_record('applicants', applicant_record_id)
+    return rec['fields'].get('Applicant ID') or rec['id']
+
+def _gone(exc) -> bool:
+    return getattr(getattr(exc, 'response', None), 'status_code', None) == 404
+
+def resolve_applicants(changes) -> set:
+    """
+    Applicant IDs affected by a list of changes_from_payload tuples. Our own
+    writes to Applicants are ignored, as in sync.changed_applicant_ids: only
+    new rows and the fields in sync.applicant_fields count. Lookup errors
+    are raised so the payloads are read again on the next ping; only
+    records deleted since the change are skipped.
+    """
+    watched = set(SYNC_CONFIG.get('applicant_fields') or [])
+    ids = set()
+    # one notification often touches several rows of the same applicant
+    with unit_of_work():
+        for table_key, record_id, fields, created in changes:
+            try:
+                if table_key == 'applicants':
+                    if created or fields & watched:
+                        ids.add(_applicant_id(record_id))
+                elif table_key in CHILD_TABLES:
+                    linked = get_record(table_key, record_id)['fields'].get(CHILD_TABLES[table_key]) or []
+                    ids.update(_applicant_id(rid) for rid in (linked if isinstance(linked, list) else [linked]))
+            except Exception as e:
+                if not _gone(e):
+                    raise
+                print(f'Skipping {table_key} record {record_id}: deleted since the change')
+    return ids
+
+class AirtablePayloads:
+    """
+    Reads a webhook's payloads from Airtable, keeping the cursor in a local
+    file. fetch() does not move the cursor; commit() does, once the
+    payloads have been handled.
+    """
+    def __init__(self, cursor_path: str = CURSOR_PATH):
+        self.cursor_path = cursor_path
+
+    def _cursors(self) -> dict:
+        try:
+            with open(self.cursor_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, cursors: dict):
+        directory = os.path.dirname(self.cursor_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.cursor_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cursors, f)
+        os.replace(tmp, self.cursor_path)
+
+    def fetch(self, webhook_id: str):
+        """(payloads since the saved cursor, cursor to commit after handling them)."""
+        cursor = self._cursors().get(webhook_id, 1)
+        api = get_api()
+        url = api.build_url(f"bases/{CONFIG['airtable']['base_id']}/webhooks/{webhook_id}/payloads")
+        payloads = []
+        while True:
+            page = api.get(url, params={'cursor': cursor})
+            payloads.extend(page.get('payloads') or [])
+            cursor = page['cursor']
+            if not page.get('mightHaveMore'):
+                break
+        return payloads, cursor
+
+    def commit(self, webhook_id: str, cursor):
+        cursors = self._cursors()
+        cursors[webhook_id] = cursor
+        self._save(cursors)
+
+def schema_maps():
+    """({table id: config table key}, {field id: field name}) for the configured base."""
+    names = {name: key for key, name in CONFIG['airtable']['tables'].items()}
+    table_keys, field_names = {}, {}
+    for table in get_api().base(CONFIG['airtable']['base_id']).schema().tables:
+        if table.name in names:
+            table_keys[table.id] = names[table.name]
+            field_names.update({f.id: f.name for f in table.fields})
+    return table_keys, field_names
+
+class WebhookReceiver:
+    """
+    Turns notification pings into debounced jobs. `source.fetch(webhook_id)`
+    returns the new payloads and their cursor, and `source.commit(webhook_id,
+    cursor)` is called once every job is queued; pings are handled one at a
+    time so the cursor is never read twice.
+    """
+    def __init__(self, queue, source=None, table_keys=None, field_names=None,
+                 debounce: float = DEBOUNCE_SECONDS, max_wait: float = MAX_WAIT_SECONDS):
+        self.queue = queue
+        self.source = source or AirtablePayloads()
+        self._maps = (table_keys, field_names) if table_keys is not None else None
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+
+    def notify(self, ping: dict) -> list:
+        """Handles one ping; returns the Applicant IDs enqueued."""
+        webhook_id = (ping.get('webhook') or {}).get('id')
+        if not webhook_id:
+            raise ValueError('notification has no webhook id')
+        with self._lock:
+            if self._maps is None:
+                self._maps = schema_maps()
+            table_keys, field_names = self._maps
+            payloads, cursor = self.source.fetch(webhook_id)
+            changes = []
+            for payload in payloads:
+                changes.extend(changes_from_payload(payload, table_keys, field_names))
+            ids = sorted(resolve_applicants(changes))
+            for aid in ids:
+                self.queue.enqueue(aid, delay=self.debounce, max_wait=self.max_wait)
+            # only now are these payloads safe to skip; if anything above raised they are read again
+            self.source.commit(webhook_id, cursor)
+        print(f'Webhook {webhook_id}: {len(changes)} changed records -> {len(ids)} applicants queued')
+        return ids
+
+def verify_mac(secret_b64: str, body: bytes, header: str) -> bool:
+    """Checks Airtable's X-Airtable-Content-MAC header against the webhook's MAC secret."""
+    try:
+        key = base64.b64decode(secret_b64, validate=True)
+    except (binascii.Error, ValueError):
+        # a mangled secret can never produce a matching signature
+        return False
+    digest = hmac.new(key, body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f'hmac-sha256={digest}', header or '')
+
+def make_server(receiver: WebhookReceiver, host: str = None, port: int = None, mac_secret: str = None,
+                allow_unsigned: bool = None):
+    """
+    HTTP server passing POSTed notifications to receiver; port 0 picks a free
+    port. Without a MAC secret anyone who can reach it could make us read the
+    base, so it refuses to start unless allow_unsigned (webhook.allow_unsigned).
+    """
+    mac_secret = mac_secret if mac_secret is not None else WEBHOOK_CONFIG.get('mac_secret')
+    if allow_unsigned is None:
+        allow_unsigned = bool(WEBHOOK_CONFIG.get('allow_unsigned'))
+    if not mac_secret and not allow_unsigned:
+        raise ValueError('webhook.mac_secret (AIRTABLE_WEBHOOK_MAC_SECRET) is not set; '
+                         'set it, or webhook.allow_unsigned: true to accept unsigned notifications')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if mac_secret and not verify_mac(mac_secret, body, self.headers.get('X-Airtable-Content-MAC')):
+                return self._reply(401, {'error': 'bad signature'})
+            try:
+                ids = receiver.notify(json.loads(body or b'{}'))
+            except ValueError as e:
+                return self._reply(400, {'error': str(e)})
+            except Exception as e:
+                print('Webhook handling failed:', e)
+                return self._reply(500, {'error': str(e)})
+            self._reply(200, {'enqueued': ids})
+
+        def _reply(self, status, data):
+            out = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return ThreadingHTTPServer((host or WEBHOOK_CONFIG.get('host') or '0.0.0.0',
+                                port if port is not None else WEBHOOK_CONFIG.get('port') or 8080), Handler)
+
+if __name__ == '__main__':
+    from jobqueue import JobQueue
+    try:
+        server = make_server(WebhookReceiver(JobQueue()))
+    except ValueError as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+    host, port = server.server_address[:2]
+    print(f'Listening for Airtable notifications on http://{host}:{port}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
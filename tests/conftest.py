@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# the pipeline modules import each other as top-level modules from src/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# llm.py refuses to import without keys; tests never reach the real services
+os.environ.setdefault('AIRTABLE_API_KEY', 'test-airtable-key')
+os.environ.setdefault('AIRTABLE_BASE_ID', 'appTest')
+os.environ.setdefault('GEMINI_API_KEY', 'test-gemini-key')
+
+
+@pytest.fixture(autouse=True)
+def _fresh_circuit_breakers(monkeypatch):
+    # breakers are process-wide; start every test closed and never really sleep
+    import retries
+    retries.reset()
+    monkeypatch.setattr(retries, 'sleep', lambda seconds: None)
+    yield
+    retries.reset()
+
+
+@pytest.fixture(autouse=True)
+def result_cache(monkeypatch, tmp_path):
+    # evaluate_streaming reads and writes the LLM result cache; keep it out of .cache/
+    import llm
+    from llm_cache import ResultCache
+    cache = ResultCache(str(tmp_path / 'llm_results.sqlite3'))
+    monkeypatch.setattr(llm, 'get_result_cache', lambda: cache)
+    return cache
@@ -0,0 +1,444 @@
+"""
+In-process stand-ins for Airtable and Gemini, shared by the tests and by
+benchmarks/bench_pipeline.py. FakeAirtable mimics the pyairtable Table
+methods the pipeline uses, counts every HTTP request a real client would
+make (one per 100-record page, one per 10-record batch chunk) and can add
+latency or inject 429s.
+"""
+import itertools
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import requests
+
+import airtable_utils
+
+PAGE_SIZE = 100
+BATCH_SIZE = 10
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt):
+    return dt.isoformat().replace('+00:00', '.000Z')
+
+
+def _chunks(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)] or [[]]
+
+
+def rate_limited_error():
+    response = requests.Response()
+    response.status_code = 429
+    response.headers['Retry-After'] = '0'
+    return requests.exceptions.HTTPError('429 Client Error: Too Many Requests', response=response)
+
+
+# --- formula evaluation ----------------------------------------------------
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<field>\{[^}]*\})
+  | (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>!=|<=|>=|[=(),&<>])
+)""", re.VERBOSE)
+
+
+def _tokenize(formula):
+    pos, tokens = 0, []
+    formula = formula.strip()
+    while pos < len(formula):
+        m = _TOKEN.match(formula, pos)
+        if not m:
+            raise ValueError(f'Unsupported formula near: {formula[pos:pos + 20]!r}')
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+def _unquote(s):
+    return re.sub(r'\\(.)', r'\1', s[1:-1])
+
+
+def _as_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(_as_text(v) for v in value)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def _as_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+class _Formula:
+    """Parses the subset of Airtable formulas the pipeline generates."""
+    def __init__(self, formula):
+        self.tokens = _tokenize(formula)
+        self.pos = 0
+        self.tree = self._expr()
+        if self.pos != len(self.tokens):
+            raise ValueError(f'Trailing tokens in formula: {formula!r}')
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _take(self, value=None):
+        tok = self._peek()
+        if value is not None and tok[1] != value:
+            raise ValueError(f'Expected {value!r}, got {tok[1]!r}')
+        self.pos += 1
+        return tok
+
+    def _expr(self):
+        left = self._concat()
+        if self._peek()[1] in ('=', '!=', '<', '>', '<=', '>='):
+            op = self._take()[1]
+            return ('cmp', op, left, self._concat())
+        return left
+
+    def _concat(self):
+        parts = [self._primary()]
+        while self._peek()[1] == '&':
+            self._take()
+            parts.append(self._primary())
+        return parts[0] if len(parts) == 1 else ('concat', parts)
+
+    def _primary(self):
+        kind, value = self._take()
+        if kind == 'field':
+            return ('field', value[1:-1])
+        if kind == 'string':
+            return ('lit', _unquote(value))
+        if kind == 'number':
+            return ('lit', float(value))
+        if kind == 'op' and value == '(':
+            inner = self._expr()
+            self._take(')')
+            return inner
+        if kind == 'name':
+            args = []
+            self._take('(')
+            while self._peek()[1] != ')':
+                args.append(self._expr())
+                if self._peek()[1] == ',':
+                    self._take()
+            self._take(')')
+            return ('call', value.upper(), args)
+        raise ValueError(f'Unexpected token {value!r}')
+
+    def evaluate(self, record):
+        return self._eval(self.tree, record)
+
+    def _eval(self, node, rec):
+        kind = node[0]
+        if kind == 'lit':
+            return node[1]
+        if kind == 'field':
+            return rec['fields'].get(node[1])
+        if kind == 'concat':
+            return ''.join(_as_text(self._eval(p, rec)) for p in node[1])
+        if kind == 'cmp':
+            _, op, left, right = node
+            a, b = self._eval(left, rec), self._eval(right, rec)
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+                pass
+            else:
+                a, b = _as_text(a), _as_text(b)
+            return {'=': a == b, '!=': a != b, '<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b}[op]
+        name, args = node[1], node[2]
+        if name == 'OR':
+            return any(self._eval(a, rec) for a in args)
+        if name == 'AND':
+            return all(self._eval(a, rec) for a in args)
+        if name == 'NOT':
+            return not self._eval(args[0], rec)
+        if name == 'RECORD_ID':
+            return rec['id']
+        if name == 'CREATED_TIME':
+            return _as_time(rec['createdTime'])
+        if name == 'LAST_MODIFIED_TIME':
+            fields = [a[1] for a in args if a[0] == 'field']
+            times = [rec['_modified'][f] for f in fields if f in rec['_modified']] if fields else [rec['_modified_at']]
+            return max(times) if times else _as_time(rec['createdTime'])
+        if name == 'DATETIME_PARSE':
+            return _as_time(self._eval(args[0], rec))
+        if name == 'IS_AFTER':
+            return _as_time(self._eval(args[0], rec)) > _as_time(self._eval(args[1], rec))
+        if name == 'IS_BEFORE':
+            return _as_time(self._eval(args[0], rec)) < _as_time(self._eval(args[1], rec))
+        if name == 'LOWER':
+            return _as_text(self._eval(args[0], rec)).lower()
+        if name == 'ARRAYJOIN':
+            return _as_text(self._eval(args[0], rec))
+        if name == 'TRUE':
+            return True
+        if name == 'FALSE':
+            return False
+        raise ValueError(f'Unsupported formula function {name}')
+
+
+# --- Airtable ----------------------------------------------------------------
+
+class FakeTable:
+    def __init__(self, airtable, name):
+        self.airtable = airtable
+        self.name = name
+        self.records = {}
+
+    def _public(self, rec, fields=None):
+        out = {'id': rec['id'], 'createdTime': rec['createdTime'], 'fields': dict(rec['fields'])}
+        if fields:
+            out['fields'] = {k: v for k, v in out['fields'].items() if k in fields}
+        return out
+
+    def _touch(self, rec, fields):
+        now = _now()
+        for k, v in fields.items():
+            if v is None:
+                rec['fields'].pop(k, None)
+            else:
+                rec['fields'][k] = v
+            rec['_modified'][k] = now
+        rec['_modified_at'] = now
+
+    def _new_record(self, fields):
+        rid = 'rec' + format(next(self.airtable._ids), '014d')
+        now = _now()
+        rec = {'id': rid, 'createdTime': _iso(now), 'fields': {}, '_modified': {}, '_modified_at': now}
+        self._touch(rec, fields)
+        self.records[rid] = rec
+        return rec
+
+    def seed(self, rows):
+        """Adds rows without counting requests; returns the created records."""
+        return [self._public(self._new_record(fields)) for fields in rows]
+
+    # pyairtable.Table surface -------------------------------------------------
+
+    def iterate(self, formula=None, fields=None, page_size=PAGE_SIZE, max_records=None, **options):
+        matcher = _Formula(formula) if formula else None
+        rows = [r for r in self.records.values() if matcher is None or matcher.evaluate(r)]
+        if max_records:
+            rows = rows[:max_records]
+        for page in _chunks(rows, min(page_size or PAGE_SIZE, PAGE_SIZE)):
+            self.airtable._request(self.name, 'list')
+            yield [self._public(r, fields) for r in page]
+
+    def all(self, **options):
+        return [rec for page in self.iterate(**options) for rec in page]
+
+    def first(self, **options):
+        rows = self.all(max_records=1, **options)
+        return rows[0] if rows else None
+
+    def get(self, record_id, **options):
+        self.airtable._request(self.name, 'get')
+        if record_id not in self.records:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError('404 Client Error: Not Found', response=response)
+        return self._public(self.records[record_id])
+
+    def create(self, fields, **options):
+        self.airtable._request(self.name, 'create')
+        return self._public(self._new_record(fields))
+
+    def batch_create(self, records, **options):
+        out = []
+        for chunk in _chunks(records, BATCH_SIZE):
+            if chunk:
+                self.airtable._request(self.name, 'create')
+                out.extend(self._public(self._new_record(f)) for f in chunk)
+        return out
+
+    def update(self, record_id, fields, **options):
+        self.airtable._request(self.name, 'update')
+        rec = self.records[record_id]
+        self._touch(rec, fields)
+        return self._public(rec)
+
+    def batch_update(self, records, **options):
+        out = []
+        for chunk in _chunks(records, BATCH_SIZE):
+            if chunk:
+                self.airtable._request(self.name, 'update')
+                for r in chunk:
+                    rec = self.records[r['id']]
+                    self._touch(rec, r['fields'])
+                    out.append(self._public(rec))
+        return out
+
+    def delete(self, record_id):
+        self.airtable._request(self.name, 'delete')
+        del self.records[record_id]
+        return {'id': record_id, 'deleted': True}
+
+    def batch_delete(self, record_ids):
+        out = []
+        for chunk in _chunks(record_ids, BATCH_SIZE):
+            if chunk:
+                self.airtable._request(self.name, 'delete')
+                for rid in chunk:
+                    self.records.pop(rid, None)
+                    out.append({'id': rid, 'deleted': True})
+        return out
+
+
+class FakeAirtable:
+    """
+    A whole fake base. Tables are addressed by their config.yaml key
+    (fake.table('work')); calls counts requests per (table name, operation).
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._tables = {}
+
+    def _request(self, table_name, op):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.rate_limited += 1
+            raise rate_limited_error()
+        self.calls[(table_name, op)] += 1
+
+    @property
+    def requests(self):
+        return sum(self.calls.values())
+
+    def reset_counts(self):
+        self.calls.clear()
+        self.rate_limited = 0
+
+    def table_by_name(self, name):
+        if name not in self._tables:
+            self._tables[name] = FakeTable(self, name)
+        return self._tables[name]
+
+    def table(self, table_key):
+        return self.table_by_name(airtable_utils.CONFIG['airtable']['tables'][table_key])
+
+    @contextmanager
+    def installed(self):
+        """Points airtable_utils (and every module using it) at this fake."""
+        fake = self
+
+        class _Api:
+            def table(self, base_id, table_name):
+                return fake.table_by_name(table_name)
+
+        saved = airtable_utils.get_api
+        airtable_utils.get_api = lambda: _Api()
+        airtable_utils.get_table.cache_clear()
+        try:
+            yield self
+        finally:
+            airtable_utils.get_api = saved
+            airtable_utils.get_table.cache_clear()
+
+
+def seed_applicants(fake, count, seed=0):
+    """
+    Fills the fake base with `count` synthetic applicants, each with a
+    Personal Details row, 1-4 Work Experience rows and a Salary Preferences
+    row. Returns the list of Applicant IDs.
+    """
+    rnd = random.Random(seed)
+    companies = ['Google', 'Meta', 'Acme', 'Initech', 'Globex', 'Stanbic Bank', 'Umbrella', 'Hooli']
+    titles = ['Data Engineer', 'Backend Engineer', 'Analyst', 'ML Engineer', 'SRE']
+    locations = ['Toronto, Canada', 'Berlin, Germany', 'Nairobi, Kenya', 'Austin, United States', 'Pune, India']
+    applicants = fake.table('applicants').seed({} for _ in range(count))
+    ids = []
+    personal, work, salary = [], [], []
+    for i, app in enumerate(applicants):
+        aid = app['id']
+        fake.table('applicants').records[aid]['fields']['Applicant ID'] = aid
+        ids.append(aid)
+        personal.append({'Full Name': f'Applicant {i}', 'Email': f'applicant{i}@example.com',
+                         'Location': rnd.choice(locations), 'LinkedIn': f'https://linkedin.com/in/a{i}',
+                         'Applicant ID': [aid]})
+        for _ in range(rnd.randint(1, 4)):
+            start = rnd.randint(2008, 2022)
+            work.append({'Company': rnd.choice(companies), 'Title': rnd.choice(titles),
+                         'Start': f'{start}-01-01', 'End': f'{min(start + rnd.randint(1, 5), 2025)}-01-01',
+                         'Technologies': 'Python, SQL', 'Applicant ID': [aid]})
+        salary.append({'Preferred Rate': rnd.choice([40, 80, 100, 150]), 'Minimum Rate': 30,
+                       'Currency': 'USD', 'Availability': f'{rnd.choice([10, 20, 40])} hrs/week',
+                       'Applicant ID': [aid]})
+    fake.table('personal').seed(personal)
+    fake.table('work').seed(work)
+    fake.table('salary').seed(salary)
+    return ids
+
+
+# --- Gemini ------------------------------------------------------------------
+
+class ResourceExhausted(Exception):
+    """Same class name as google.api_core's 429 error."""
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Stream:
+    """Iterates the response in small chunks, counting how many were consumed."""
+    def __init__(self, model, text, chunk_size):
+        self.model = model
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.model.chunks_sent += 1
+            yield _Response(chunk)
+
+
+class FakeGeminiModel:
+    """
+    Stands in for genai.GenerativeModel. Returns a well-formed evaluation,
+    optionally after `latency` seconds, and raises ResourceExhausted for a
+    fraction `quota_error_rate` of calls.
+    """
+    def __init__(self, latency=0.0, quota_error_rate=0.0, seed=0, text=None):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.text = text or ("Summary: Experienced engineer with a steady record.\n"
+                             "Score: 7\n"
+                             "Issues: None\n"
+                             "Follow-Ups:\n* Confirm availability\n* Confirm rate")
+        self.calls = 0
+        self.prompt_chars = 0
+        self.chunks_sent = 0
+        self.chunk_size = 16
+        self._random = random.Random(seed)
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota_error_rate and self._random.random() < self.quota_error_rate:
+            raise ResourceExhausted('429 Resource has been exhausted (e.g. check quota).')
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        if stream:
+            return _Stream(self, self.text, self.chunk_size)
+        return _Response(self.text)
@@ -0,0 +1,183 @@
+import airtable_utils
+from airtable_utils import WriteBuffer, write_buffer, update_record, create_record, delete_record
+
+
+class RecordingTable:
+    def __init__(self):
+        self.calls = []
+
+    def batch_create(self, rows):
+        self.calls.append(('create', rows))
+
+    def batch_update(self, rows):
+        self.calls.append(('update', rows))
+
+    def batch_delete(self, ids):
+        self.calls.append(('delete', ids))
+
+
+def _patch_tables(monkeypatch):
+    tables = {}
+    monkeypatch.setattr(airtable_utils, 'get_table', lambda key: tables.setdefault(key, RecordingTable()))
+    return tables
+
+
+def test_updates_to_same_record_are_merged(monkeypatch):
+    tables = _patch_tables(monkeypatch)
+    with write_buffer():
+        update_record('applicants', 'rec1', {'Compressed JSON': '{}'})
+        update_record('applicants', 'rec1', {'Shortlist status': True})
+        update_record('applicants', 'rec1', {'LLM Score': 7})
+    assert tables['applicants'].calls == [
+        ('update', [{'id': 'rec1', 'fields': {'Compressed JSON': '{}', 'Shortlist status': True, 'LLM Score': 7}}])
+    ]
+
+
+def test_delete_drops_pending_update_and_nested_blocks_share_buffer(monkeypatch):
+    tables = _patch_tables(monkeypatch)
+    with write_buffer() as outer:
+        with write_buffer() as inner:
+            assert inner is outer
+            update_record('work', 'rec1', {'Title': 'x'})
+            create_record('work', {'Title': 'y'})
+        delete_record('work', 'rec1')
+        assert tables == {}
+    assert tables['work'].calls == [('create', [{'Title': 'y'}]), ('delete', ['rec1'])]
+
+
+def test_auto_flush(monkeypatch):
+    tables = _patch_tables(monkeypatch)
+    buf = WriteBuffer(auto_flush=2)
+    buf.update('salary', 'rec1', {'Currency': 'USD'})
+    assert tables == {}
+    buf.update('salary', 'rec2', {'Currency': 'EUR'})
+    assert len(tables['salary'].calls) == 1
+    assert len(buf) == 0
+
+
+def test_failed_flush_keeps_unsent_writes(monkeypatch):
+    tables = _patch_tables(monkeypatch)
+    sent = []
+
+    def flaky_update(rows):
+        if sent:
+            raise ConnectionError('connection reset')
+        sent.append(rows)
+
+    monkeypatch.setattr(RecordingTable, 'batch_update', lambda self, rows: flaky_update(rows))
+    buf = WriteBuffer(auto_flush=25)
+    for i in range(24):
+        buf.update('applicants', f'rec{i}', {'LLM Score': i})
+    buf.create('work', {'Title': 'x'})
+    # the write that trips a failing auto-flush does not raise
+    assert len(sent) == 1 and tables['work'].calls == [('create', [{'Title': 'x'}])]
+    assert len(buf) == 14
+    buf.update('applicants', 'rec20', {'Shortlist status': True})
+    monkeypatch.setattr(RecordingTable, 'batch_update', lambda self, rows: sent.append(rows))
+    sent.clear()
+    assert buf.flush() == {'create': 0, 'update': 14, 'delete': 0}
+    assert {'id': 'rec20', 'fields': {'LLM Score': 20, 'Shortlist status': True}} in sent[0] + sent[1]
+    assert len(buf) == 0
+
+
+def test_find_many_by_field_escapes_chunks_and_projects(monkeypatch):
+    from fakes import FakeAirtable
+    from airtable_utils import find_by_field, find_many_by_field
+    fake = FakeAirtable()
+    names = [f'user{i}' for i in range(40)] + ["O'Brien", 'back\\slash']
+    fake.table('applicants').seed({'Applicant ID': n, 'Email': f'{i}@x'} for i, n in enumerate(names))
+    monkeypatch.setattr(airtable_utils, 'MAX_FORMULA_URL_CHARS', 400)
+    with fake.installed():
+        assert find_by_field('applicants', 'Applicant ID', "O'Brien")[0]['fields']['Applicant ID'] == "O'Brien"
+        fake.reset_counts()
+        found = find_many_by_field('applicants', 'Applicant ID', names + ['missing', 'user1'], fields=['Email'])
+    assert fake.calls[('Applicants', 'list')] > 1
+    assert set(found) == set(names) | {'missing'}
+    assert found['missing'] == []
+    assert found['back\\slash'][0]['fields'] == {'Applicant ID': 'back\\slash', 'Email': '41@x'}
+
+
+def test_unit_of_work_memoises_reads_and_applies_writes():
+    from fakes import FakeAirtable
+    from airtable_utils import find_by_field, get_record, unit_of_work
+    fake = FakeAirtable()
+    rec = fake.table('applicants').seed([{'Applicant ID': 'A1'}])[0]
+    with fake.installed(), unit_of_work() as uow:
+        with write_buffer():
+            row = find_by_field('applicants', 'Applicant ID', 'A1')[0]
+            update_record('applicants', rec['id'], {'LLM Score': 7})
+            assert find_by_field('applicants', 'Applicant ID', 'A1')[0] is row
+            assert get_record('applicants', rec['id'])['fields']['LLM Score'] == 7
+        # changing the filtered field forgets the query
+        update_record('applicants', rec['id'], {'Applicant ID': 'A2'})
+        assert find_by_field('applicants', 'Applicant ID', 'A1') == []
+    assert uow.saved == 2
+    assert fake.calls[('Applicants', 'list')] == 2
+    assert fake.calls[('Applicants', 'get')] == 0
+
+
+def test_token_bucket_paces_concurrent_callers():
+    import threading
+    import time
+    from airtable_utils import TokenBucket
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(3)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 12 tokens at 50/s with a burst of one: at least 11 intervals of 20ms
+    assert time.monotonic() - started >= 11 / 50 - 0.01
+
+
+def test_get_table_returns_one_shared_handle():
+    from airtable_utils import get_api, get_table
+    get_table.cache_clear()
+    try:
+        table = get_table('applicants')
+        assert get_table('applicants') is table
+        assert get_table('work').api is table.api is get_api()
+        assert table.name == airtable_utils.CONFIG['airtable']['tables']['applicants']
+    finally:
+        get_table.cache_clear()
+
+
+def test_every_http_call_waits_for_the_shared_limiter(monkeypatch):
+    import requests
+    from airtable_utils import get_api
+
+    class CountingLimiter:
+        acquired = 0
+
+        def acquire(self):
+            self.acquired += 1
+
+    limiter = CountingLimiter()
+    monkeypatch.setattr(airtable_utils, 'LIMITER', limiter)
+    api = get_api()
+
+    def respond(*args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"records": []}'
+        return response
+
+    monkeypatch.setattr(api.session, 'request', respond)
+    api.request('GET', api.build_url('bases/appTest/tblTest'))
+    api.request('GET', api.build_url('bases/appTest/tblTest'))
+    assert limiter.acquired == 2
+
+
+def test_get_records_and_find_any_by_field():
+    from fakes import FakeAirtable
+    from airtable_utils import find_any_by_field, get_records
+    fake = FakeAirtable()
+    apps = fake.table('applicants').seed({'Applicant ID': f'A{i}'} for i in range(5))
+    fake.table('work').seed({'Title': f'T{i}', 'Applicant ID': [apps[i % 2]['id']]} for i in range(4))
+    with fake.installed():
+        found = get_records('applicants', [apps[0]['id'], apps[3]['id'], 'recMissing'], fields=['Applicant ID'])
+        work = find_any_by_field('work', 'Applicant ID', [apps[1]['id'], apps[1]['id']])
+    assert {r['fields']['Applicant ID'] for r in found.values()} == {'A0', 'A3'}
+    assert sorted(r['fields']['Title'] for r in work) == ['T1', 'T3']
+    assert fake.calls[('Applicants', 'list')] == 1 and fake.calls[('Work Experience', 'list')] == 1
@@ -0,0 +1,40 @@
+import json
+
+import codec
+
+
+PAYLOAD = {
+    'version': '1.0.0',
+    'applicant_id': 'rec1',
+    'personal': {'Full Name': 'Ada', 'LinkedIn': None},
+    'experience': [{'Company': 'Acme', 'End': '', 'Tags': []}, {}],
+    'salary': {},
+    'meta': {'compressed_at': '2024-01-01T00:00:00+00:00', 'compressor_version': 'v1'},
+}
+
+
+def test_v2_drops_empties_and_bumps_version():
+    text = codec.encode(PAYLOAD, pack=False)
+    assert ': ' not in text and 'null' not in text
+    assert codec.decode(text) == {
+        'version': codec.FORMAT_VERSION,
+        'applicant_id': 'rec1',
+        'personal': {'Full Name': 'Ada'},
+        'experience': [{'Company': 'Acme'}],
+        'meta': PAYLOAD['meta'],
+    }
+
+
+def test_packed_roundtrip_and_threshold():
+    packed = codec.encode(PAYLOAD, pack=True)
+    assert packed.startswith(codec.PACK_HEADER)
+    assert codec.decode(packed) == codec.decode(codec.encode(PAYLOAD, pack=False))
+    big = {**PAYLOAD, 'experience': [{'Company': 'Acme', 'Description': 'x' * 100}] * (codec.PACK_THRESHOLD // 100)}
+    assert codec.encode(big).startswith(codec.PACK_HEADER)
+    assert not codec.encode(PAYLOAD).startswith(codec.PACK_HEADER)
+
+
+def test_reads_v1_payloads():
+    old = json.dumps(PAYLOAD, indent=2)
+    assert codec.decode(old) == PAYLOAD
+    assert codec.decode(PAYLOAD) is PAYLOAD
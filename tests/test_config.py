@@ -0,0 +1,21 @@
+import config
+
+
+def test_env_references_are_substituted_once(monkeypatch, tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text('airtable:\n  api_key: ${TEST_AT_KEY}\n  base_id: ${TEST_UNSET_VAR}\n')
+    monkeypatch.setenv('PIPELINE_CONFIG', str(path))
+    monkeypatch.setenv('TEST_AT_KEY', 'pat123')
+    monkeypatch.delenv('TEST_UNSET_VAR', raising=False)
+    config.load_config.cache_clear()
+    try:
+        loaded = config.load_config()
+        assert loaded == {'airtable': {'api_key': 'pat123', 'base_id': None}}
+        assert config.load_config() is loaded
+    finally:
+        config.load_config.cache_clear()
+
+
+def test_importing_llm_does_not_build_clients():
+    import llm
+    assert llm.gemini_model is None
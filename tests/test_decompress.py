@@ -0,0 +1,39 @@
+from decompress import plan_rows
+
+
+def _rec(rid, **fields):
+    return {'id': rid, 'fields': {'Applicant ID': ['recA'], **fields}}
+
+
+def test_unchanged_rows_are_skipped():
+    existing = [_rec('w1', Company='Acme', Title='Engineer', Start='2020-01-01')]
+    desired = [{'Company': 'Acme', 'Title': 'Engineer', 'Start': '2020-01-01', 'Applicant ID': ['recA']}]
+    assert plan_rows(existing, desired) == ([], [], [])
+
+
+def test_edits_update_in_place_and_only_true_additions_and_removals():
+    existing = [
+        _rec('w1', Company='Acme', Title='Engineer', Start='2020-01-01'),
+        _rec('w2', Company='Initech', Title='Analyst', Start='2018-01-01', End='2019-12-31'),
+        _rec('w3', Company='Globex', Title='Intern', Start='2016-06-01'),
+    ]
+    desired = [
+        {'Company': 'Acme', 'Title': 'Engineer', 'Start': '2020-01-01', 'End': '2023-05-01'},
+        {'Company': 'Initech', 'Title': 'Analyst', 'Start': '2018-01-01', 'End': '2019-12-31'},
+    ]
+    creates, updates, deletes = plan_rows(existing, desired)
+    assert creates == []
+    assert updates == [('w1', {'End': '2023-05-01'})]
+    assert deletes == ['w3']
+
+
+def test_leftover_rows_are_reused_before_creating():
+    existing = [_rec('w1', Company='Old Co', Title='Dev', Start='2015-01-01')]
+    desired = [
+        {'Company': 'New Co', 'Title': 'Lead', 'Start': '2021-01-01'},
+        {'Company': 'Other Co', 'Title': 'Dev', 'Start': '2019-01-01'},
+    ]
+    creates, updates, deletes = plan_rows(existing, desired)
+    assert updates == [('w1', {'Company': 'New Co', 'Title': 'Lead', 'Start': '2021-01-01'})]
+    assert creates == [{'Company': 'Other Co', 'Title': 'Dev', 'Start': '2019-01-01'}]
+    assert deletes == []
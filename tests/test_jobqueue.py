@@ -0,0 +1,118 @@
+import threading
+
+from jobqueue import DONE, FAILED, PENDING, JobQueue
+
+
+def test_jobs_are_claimed_once_and_retried_until_failed(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2, retry_backoff=0)
+    first = queue.enqueue('rec1')
+    assert queue.enqueue('rec1') == first
+    queue.enqueue('rec2')
+
+    job = queue.claim('w1')
+    assert job['applicant_id'] == 'rec1' and job['attempts'] == 1
+    queue.complete(job['id'])
+
+    job = queue.claim('w1')
+    queue.fail(job['id'], 'boom')
+    assert queue.get(job['id'])['state'] == PENDING
+    job = queue.claim('w2')
+    assert job['attempts'] == 2
+    queue.fail(job['id'], 'boom again')
+    assert queue.claim('w1') is None
+    assert queue.counts() == {PENDING: 0, 'running': 0, DONE: 1, FAILED: 1}
+    assert queue.get(job['id'])['last_error'] == 'boom again'
+
+
+def test_concurrent_workers_never_share_a_job(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    queue = JobQueue(path)
+    for i in range(40):
+        queue.enqueue(f'rec{i}')
+    claimed = []
+
+    def worker(name):
+        q = JobQueue(path)
+        while True:
+            job = q.claim(name)
+            if job is None:
+                return
+            claimed.append(job['applicant_id'])
+            q.complete(job['id'])
+
+    threads = [threading.Thread(target=worker, args=(f'w{i}',)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(f'rec{i}' for i in range(40))
+
+
+def test_worker_drains_queue(monkeypatch, tmp_path):
+    import run_pipeline
+    seen = []
+
+    def fake_run(aid):
+        seen.append(aid)
+        if aid == 'bad':
+            raise ValueError('Applicant not found')
+
+    monkeypatch.setattr(run_pipeline, 'run_for_applicant', fake_run)
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=1)
+    for aid in ('rec1', 'bad', 'rec2'):
+        queue.enqueue(aid)
+    assert run_pipeline.run_worker(queue, worker_id='test', drain=True) == 3
+    assert seen == ['rec1', 'bad', 'rec2']
+    assert queue.counts()[FAILED] == 1 and queue.counts()[DONE] == 2
+
+
+def test_worker_defers_jobs_while_a_backend_is_down(monkeypatch, tmp_path):
+    import run_pipeline
+    from retries import CircuitOpenError
+
+    def down(aid):
+        raise CircuitOpenError('gemini', 0)
+
+    monkeypatch.setattr(run_pipeline, 'run_for_applicant', down)
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=1)
+    job_id = queue.enqueue('rec1')
+    stop = threading.Event()
+    real_defer = queue.defer
+
+    def defer(jid, delay):
+        real_defer(jid, delay)
+        stop.set()
+
+    monkeypatch.setattr(queue, 'defer', defer)
+    run_pipeline.run_worker(queue, worker_id='test', stop=stop)
+    job = queue.get(job_id)
+    assert job['state'] == PENDING and job['attempts'] == 0
+
+
+def test_stale_jobs_are_requeued_until_attempts_run_out(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2)
+    job_id = queue.enqueue('rec1')
+    queue.claim('dead-worker')
+    assert queue.requeue_stale(older_than=0) == 1
+    assert queue.get(job_id)['state'] == PENDING
+    queue.claim('dead-worker')
+    assert queue.requeue_stale(older_than=0) == 0
+    job = queue.get(job_id)
+    assert job['state'] == FAILED and 'worker died' in job['last_error']
+
+
+def test_idle_worker_keeps_requeueing_stale_jobs(monkeypatch, tmp_path):
+    import run_pipeline
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    stop = threading.Event()
+    calls = []
+
+    def requeue_stale():
+        calls.append(1)
+        if len(calls) == 3:
+            stop.set()
+        return 0
+
+    monkeypatch.setattr(queue, 'requeue_stale', requeue_stale)
+    run_pipeline.run_worker(queue, worker_id='test', poll_seconds=0, stop=stop)
+    assert len(calls) == 3
@@ -0,0 +1,43 @@
+import time
+
+from llm_cache import ResultCache, cache_key
+
+
+def test_key_ignores_compressed_at_and_key_order():
+    a = '{"applicant_id": "rec1", "meta": {"compressed_at": "2024-01-01T00:00:00", "compressor_version": "v1"}}'
+    b = '{"meta": {"compressor_version": "v1", "compressed_at": "2025-06-01T12:00:00"}, "applicant_id": "rec1"}'
+    assert cache_key(a, "gemini-1.5-flash", "1") == cache_key(b, "gemini-1.5-flash", "1")
+    assert cache_key(a, "gemini-1.5-flash", "1") != cache_key(a, "gemini-1.5-pro", "1")
+    assert cache_key(a, "gemini-1.5-flash", "1") != cache_key(a, "gemini-1.5-flash", "2")
+
+
+def test_lru_eviction_and_stats(tmp_path):
+    cache = ResultCache(str(tmp_path / "c.sqlite3"), max_entries=2)
+    cache.put("k1", {"score": 1})
+    cache.put("k2", {"score": 2})
+    time.sleep(0.01)
+    assert cache.get("k1") == {"score": 1}
+    cache.put("k3", {"score": 3})
+    assert cache.get("k2") is None
+    assert len(cache) == 2
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 2}
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "c.sqlite3"), max_age_seconds=60)
+    cache.put("k1", {"score": 1})
+    cache.max_age_seconds = 1e-9
+    time.sleep(0.01)
+    assert cache.get("k1") is None
+    assert cache.evict() == 1
+
+
+def test_failed_results_are_not_cached(result_cache, monkeypatch):
+    import llm
+    from fakes import FakeGeminiModel
+    model = FakeGeminiModel(text="I cannot evaluate this applicant.")
+    monkeypatch.setattr(llm, "gemini_model", model)
+    assert llm.evaluate_applicant("rec1", '{"a": 1}')["success"] is False
+    assert llm.evaluate_applicant("rec1", '{"a": 1}')["success"] is False
+    assert model.calls == 2
+    assert len(result_cache) == 0
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+import llm
+from llm_engine import LLMEngine, evaluate_batch, is_quota_error
+
+RESPONSE = "Summary: Solid engineer.\nScore: 8\nIssues: None\nFollow-Ups:\n* When can you start?"
+
+
+class QuotaExceeded(Exception):
+    def __str__(self):
+        return "429 Resource has been exhausted (e.g. check quota)."
+
+
+def test_quota_errors_back_off_and_retry():
+    calls = []
+
+    def generate(payload_json):
+        calls.append(payload_json)
+        if len(calls) == 1:
+            raise QuotaExceeded()
+        return RESPONSE
+
+    engine = LLMEngine(concurrency=2, requests_per_minute=6000, generate=generate)
+
+    async def run():
+        return [r async for r in engine.evaluate_many([('rec1', '{"a": 1}'), ('rec2', '{"a": 2}')])]
+
+    results = dict(asyncio.run(run()))
+    assert len(calls) == 3
+    assert results['rec1']['score'] == 8 and results['rec2']['score'] == 8
+    assert engine.limiter.rate < 100
+
+
+def test_permanent_errors_are_not_retried():
+    calls = []
+
+    def generate(payload_json):
+        calls.append(payload_json)
+        raise ValueError("API key not valid")
+
+    seen = []
+    results = evaluate_batch([('rec1', '{}')], on_result=lambda aid, r: seen.append(aid),
+                             requests_per_minute=6000, generate=generate)
+    assert calls == ['{}']
+    assert seen == ['rec1']
+    assert results['rec1']['success'] is False
+
+
+def test_is_quota_error():
+    assert is_quota_error(QuotaExceeded())
+    assert not is_quota_error(ValueError("bad request"))
+
+
+def test_second_batch_is_served_from_cache(result_cache):
+    calls = []
+
+    def generate(payload_json):
+        calls.append(payload_json)
+        return RESPONSE
+
+    evaluate_batch([('rec1', '{"a": 1, "meta": {"compressed_at": "2024-01-01"}}')], requests_per_minute=6000, generate=generate)
+    evaluate_batch([('rec1', '{"a": 1, "meta": {"compressed_at": "2024-02-02"}}')], requests_per_minute=6000, generate=generate)
+    assert len(calls) == 1
+    assert result_cache.stats()['hits'] == 1
+
+
+def test_sustained_quota_errors_slow_down_without_opening_the_breaker(monkeypatch):
+    from fakes import FakeGeminiModel
+    from retries import breaker
+    model = FakeGeminiModel(quota_error_rate=0.8)
+    monkeypatch.setattr(llm, "gemini_model", model)
+    engine = LLMEngine(concurrency=4, requests_per_minute=60000)
+
+    async def run():
+        return dict([r async for r in engine.evaluate_many([(f"rec{i}", f'{{"a": {i}}}') for i in range(30)])])
+
+    results = asyncio.run(run())
+    assert all(r["success"] for r in results.values()), results
+    assert model.calls == 30
+    assert breaker("gemini").state == "closed"
+    assert engine.limiter.rate < 1000
+
+
+def test_transient_errors_use_the_shared_attempt_limit(monkeypatch):
+    import llm_engine
+    from retries import settings
+    monkeypatch.setattr(llm_engine, "backoff", lambda *args: 0)
+    calls = []
+
+    def generate(payload_json):
+        calls.append(payload_json)
+        raise ConnectionError("connection reset")
+
+    results = evaluate_batch([('rec1', '{}')], requests_per_minute=6000, generate=generate)
+    assert results['rec1']['success'] is False
+    assert len(calls) == settings("gemini")["max_attempts"]
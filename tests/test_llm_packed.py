@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import llm
+import llm_packed
+from fakes import FakeGeminiModel
+from llm_packed import evaluate_packed, pack_items, parse_packed_response
+
+
+@pytest.fixture(autouse=True)
+def packed_result_cache(monkeypatch, result_cache):
+    # llm_packed imports get_result_cache by name, so conftest's patch of llm doesn't reach it
+    monkeypatch.setattr(llm_packed, 'get_result_cache', lambda: result_cache)
+
+
+def test_packs_respect_token_budget_and_size():
+    items = [(f'rec{i}', json.dumps({'x': 'y' * 800})) for i in range(6)]
+    packs = pack_items(items, token_budget=600, max_per_pack=10)
+    assert [len(p) for p in packs] == [2, 2, 2]
+    assert [len(p) for p in pack_items(items, token_budget=10**6, max_per_pack=4)] == [4, 2]
+    assert [len(p) for p in pack_items(items[:1], token_budget=1)] == [1]
+
+
+def test_parse_packed_response_flags_bad_entries():
+    text = '```json\n' + json.dumps({
+        'rec1': {'summary': 'Strong.', 'score': 8, 'issues': [], 'follow_ups': ['Start date?']},
+        'rec2': {'summary': '', 'score': 'n/a'},
+    }) + '\n```'
+    parsed = parse_packed_response(text, ['rec1', 'rec2', 'rec3'])
+    assert parsed['rec1'] == {'summary': 'Strong.', 'score': 8, 'issues': 'None',
+                              'follow_ups': '* Start date?', 'success': True}
+    assert parsed['rec2'] is None and parsed['rec3'] is None
+    assert parse_packed_response('not json', ['rec1']) == {'rec1': None}
+
+
+def test_only_unparsed_applicant_is_retried_alone(monkeypatch):
+    packed_reply = json.dumps({'rec1': {'summary': 'Good.', 'score': 7, 'issues': ['No dates'], 'follow_ups': []}})
+    model = FakeGeminiModel()
+    prompts = []
+
+    def generate_content(prompt, generation_config=None, **kwargs):
+        prompts.append(prompt)
+        model.text = packed_reply if 'Applicants JSON' in prompt else 'Summary: Solo.\nScore: 5\nIssues: None\nFollow-Ups:\n* Why?'
+        return FakeGeminiModel.generate_content(model, prompt)
+
+    monkeypatch.setattr(model, 'generate_content', generate_content)
+    monkeypatch.setattr(llm, 'gemini_model', model)
+    results = evaluate_packed([('rec1', '{"a": 1}'), ('rec2', '{"a": 2}')])
+    assert len(prompts) == 2 and 'Applicants JSON' in prompts[0] and 'Applicant JSON' in prompts[1]
+    assert results['rec1']['score'] == 7 and results['rec1']['issues'] == 'No dates'
+    assert results['rec2']['score'] == 5
+
+    prompts.clear()
+    evaluate_packed([('rec1', '{"a": 1}')])
+    assert prompts == []
@@ -0,0 +1,75 @@
+import pytest
+
+import llm
+from fakes import FakeGeminiModel
+from llm import MalformedResponseError, SectionParser, evaluate_streaming, parse_llm_response
+
+RESPONSE = ("Summary: Data engineer with two years in banking.\n"
+            "Strong SQL, limited cloud exposure.\n"
+            "Score: 6\n"
+            "Issues: Future start date, no education listed\n"
+            "Follow-Ups:\n"
+            "* Can you confirm your start date?\n"
+            "* Which cloud platforms have you used?\n")
+
+
+def test_multiline_sections_are_kept():
+    result = parse_llm_response(RESPONSE)
+    assert result['summary'] == 'Data engineer with two years in banking.\nStrong SQL, limited cloud exposure.'
+    assert result['score'] == 6
+    assert result['issues'] == 'Future start date, no education listed'
+    assert result['follow_ups'].splitlines() == ['* Can you confirm your start date?',
+                                                 '* Which cloud platforms have you used?']
+    assert result['success'] is True
+
+
+def test_score_is_reported_as_soon_as_its_line_arrives():
+    seen = []
+    parser = SectionParser(on_score=seen.append)
+    head, tail = RESPONSE.split('Issues:')
+    for i in range(0, len(head), 5):
+        parser.feed(head[i:i + 5])
+    assert seen == [6]
+    parser.feed('Issues:' + tail)
+    assert seen == [6] and not parser.malformed
+
+
+@pytest.mark.parametrize('text', [
+    'I am sorry, but I cannot evaluate this applicant. ' * 10,
+    'Summary: Fine.\nScore: excellent\nIssues: None\n',
+    'Summary: Fine.\nScore: 7\nSummary: again\n',
+])
+def test_malformed_output_is_detected(text):
+    parser = SectionParser()
+    parser.feed(text)
+    parser.close()
+    assert parser.malformed
+
+
+def test_streaming_stops_early_on_malformed_output(monkeypatch):
+    model = FakeGeminiModel(text='As an AI model I would rather describe this candidate in prose. ' * 20)
+    monkeypatch.setattr(llm, 'gemini_model', model)
+    with pytest.raises(MalformedResponseError):
+        evaluate_streaming('{}')
+    assert model.calls == 1
+    assert model.chunks_sent < len(model.text) // model.chunk_size
+
+
+def test_streaming_result_and_early_score(monkeypatch):
+    monkeypatch.setattr(llm, 'gemini_model', FakeGeminiModel(text=RESPONSE))
+    scores = []
+    result = evaluate_streaming('{}', on_score=scores.append)
+    assert scores == [6] and result['score'] == 6 and result['summary'].startswith('Data engineer')
+
+
+def test_long_single_line_summary_is_not_cut_off(monkeypatch):
+    summary = ('Senior data engineer with eight years across fintech and logistics, most recently leading a team '
+               'of five that rebuilt the batch ETL platform on Spark and Airflow. Strong Python and SQL, solid AWS '
+               'experience, some exposure to streaming with Kafka. Rate and availability fit the brief, though the '
+               'notice period is unclear and two short contracts in 2021 are not explained. Communication in the '
+               'application is clear and well structured overall.')
+    assert len(summary.split()) >= 70
+    model = FakeGeminiModel(text=f'Summary: {summary}\nScore: 8\nIssues: Notice period unclear\nFollow-Ups:\n* When could you start?')
+    monkeypatch.setattr(llm, 'gemini_model', model)
+    result = evaluate_streaming('{}')
+    assert result['success'] and result['summary'] == summary and result['score'] == 8
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def test_disabled_hooks_record_nothing():
+    metrics.enable(False)
+    metrics.inc('airtable_calls_total', table='work', op='list')
+    with metrics.timer('stage_seconds', stage='compress'):
+        pass
+    assert metrics.snapshot()['counters'] == [] and metrics.snapshot()['timings'] == []
+
+
+def test_prometheus_and_json_exports(tmp_path):
+    metrics.inc('airtable_calls_total', table='work', op='list')
+    metrics.inc('airtable_calls_total', 2, table='work', op='list')
+    metrics.observe('stage_seconds', 0.5, stage='llm')
+    metrics.observe('stage_seconds', 1.5, stage='llm')
+    text = metrics.to_prometheus()
+    assert '# TYPE airtable_calls_total counter' in text
+    assert 'airtable_calls_total{op="list",table="work"} 3' in text
+    assert 'stage_seconds_count{stage="llm"} 2' in text
+    assert 'stage_seconds_sum{stage="llm"} 2.000000' in text
+    metrics.dump(str(tmp_path / 'm.json'))
+    snap = json.loads((tmp_path / 'm.json').read_text())
+    assert snap['timings'][0]['max'] == 1.5
+
+
+def test_mixed_label_types_export():
+    metrics.inc('retries_total', backend='airtable', reason=429)
+    metrics.inc('retries_total', backend='airtable', reason='ReadTimeout')
+    metrics.inc('airtable_http_errors_total', status=None)
+    metrics.inc('airtable_http_errors_total', status=500)
+    reasons = {c['labels'].get('reason') for c in metrics.snapshot()['counters']}
+    assert {'429', 'ReadTimeout'} <= reasons
+    assert 'airtable_http_errors_total{status="500"} 1' in metrics.to_prometheus()
+
+
+def test_pipeline_run_is_instrumented(monkeypatch):
+    import llm
+    from fakes import FakeAirtable, FakeGeminiModel, seed_applicants
+    from run_pipeline import run_for_applicant
+    monkeypatch.setattr(llm, 'gemini_model', FakeGeminiModel())
+    fake = FakeAirtable()
+    with fake.installed():
+        run_for_applicant(seed_applicants(fake, 2)[0])
+    snap = metrics.snapshot()
+    stages = {t['labels']['stage'] for t in snap['timings'] if t['name'] == 'stage_seconds'}
+    assert stages == {'compress', 'shortlist', 'llm', 'writeback'}
+    calls = {(c['labels']['table'], c['labels']['op']) for c in snap['counters'] if c['name'] == 'airtable_calls_total'}
+    assert ('applicants', 'batch_update') in calls and ('work', 'find') in calls
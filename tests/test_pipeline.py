@@ -0,0 +1,118 @@
+import pytest
+
+import codec
+import llm
+from fakes import FakeAirtable, FakeGeminiModel, _Formula, seed_applicants
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeAirtable()
+    monkeypatch.setattr(llm, 'gemini_model', FakeGeminiModel())
+    with fake.installed():
+        yield fake
+
+
+def test_formula_subset():
+    rec = {'id': 'rec1', 'fields': {'Applicant ID': ['rec9'], 'Name': "O'Brien"}}
+    assert _Formula("{Applicant ID}='rec9'").evaluate(rec)
+    assert _Formula("OR({Name}='x', {Name}='O\\'Brien')").evaluate(rec)
+    assert not _Formula("AND(RECORD_ID()='rec1', {Name}='x')").evaluate(rec)
+
+
+def test_run_for_applicant_writes_applicants_row_once(fake):
+    from run_pipeline import run_for_applicant
+    aid = seed_applicants(fake, 3)[0]
+    fake.reset_counts()
+    run_for_applicant(aid)
+    assert fake.calls[('Applicants', 'update')] == 1
+    # the unit of work answers the repeated Applicants lookups from memory
+    assert fake.calls[('Applicants', 'list')] == 1
+    fields = fake.table('applicants').records[aid]['fields']
+    assert codec.decode(fields['Compressed JSON'])['applicant_id'] == aid
+    assert fields['LLM Score'] == 7
+    assert 'Shortlist status' in fields
+
+
+def test_single_applicant_reads_only_its_work_rows(fake):
+    from compress import build_compressed_json
+    ids = seed_applicants(fake, 120)
+    fake.reset_counts()
+    payload = build_compressed_json(ids[5])
+    expected = [r for r in fake.table('work').records.values() if r['fields']['Applicant ID'] == [ids[5]]]
+    assert len(payload['experience']) == len(expected)
+    # the whole table would take several 100-row pages
+    assert fake.calls[('Work Experience', 'list')] == 1
+
+
+def test_unchanged_applicant_is_served_from_the_result_cache(fake):
+    from run_pipeline import run_for_applicant
+    aid = seed_applicants(fake, 2)[0]
+    run_for_applicant(aid)
+    run_for_applicant(aid)
+    assert llm.gemini_model.calls == 1
+    assert fake.table('applicants').records[aid]['fields']['LLM Score'] == 7
+
+
+def test_batch_reads_each_table_once(fake):
+    from run_pipeline import run_batch
+    ids = seed_applicants(fake, 25)
+    fake.reset_counts()
+    results = run_batch()
+    assert set(results) == set(ids) and not any(results.values())
+    reads = {table: n for (table, op), n in fake.calls.items() if op == 'list'}
+    assert reads == {'Applicants': 1, 'Personal Details': 1, 'Work Experience': 1,
+                     'Salary Preferences': 1, 'Shortlisted Leads': 1}
+
+
+def test_batch_for_an_id_list_reads_only_those_rows(fake):
+    from run_pipeline import run_batch
+    ids = seed_applicants(fake, 150)
+    fake.reset_counts()
+    results = run_batch(ids[:3] + ['missing'])
+    assert results.pop('missing')
+    assert set(results) == set(ids[:3]) and not any(results.values())
+    # the full tables would take two or more 100-row pages each
+    reads = {table: n for (table, op), n in fake.calls.items() if op == 'list'}
+    assert reads == {'Applicants': 1, 'Personal Details': 1, 'Work Experience': 1,
+                     'Salary Preferences': 1, 'Shortlisted Leads': 1}
+
+
+def test_staged_run_matches_batch_writes(fake):
+    from run_pipeline import run_staged
+    ids = seed_applicants(fake, 40)
+    fake.reset_counts()
+    results = run_staged(ids + ['missing'], workers={'llm': 3}, queue_size=2, requests_per_minute=10**6)
+    assert results.pop('missing')
+    assert set(results) == set(ids) and not any(results.values())
+    assert all(fake.table('applicants').records[a]['fields']['LLM Score'] == 7 for a in ids)
+    reads = {table: n for (table, op), n in fake.calls.items() if op == 'list'}
+    assert set(reads.values()) == {1}
+    # each applicant's writes from every stage merge into one update, sent 10 per request
+    assert fake.calls[('Applicants', 'update')] <= 5
+
+
+def test_llm_failure_fails_the_worker_job(fake, monkeypatch, tmp_path):
+    import run_pipeline
+    from jobqueue import JobQueue
+    aid = seed_applicants(fake, 1)[0]
+    monkeypatch.setattr(llm, 'gemini_model', FakeGeminiModel(text='I would rather not say.'))
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=1)
+    job_id = queue.enqueue(aid)
+    run_pipeline.run_worker(queue, worker_id='test', drain=True)
+    job = queue.get(job_id)
+    assert job['state'] == 'failed' and 'Summary' in job['last_error']
+    # the compress and shortlist writes were still saved
+    assert 'Compressed JSON' in fake.table('applicants').records[aid]['fields']
+
+
+def test_staged_run_adapts_to_quota_and_uses_the_cache(fake, monkeypatch):
+    from run_pipeline import run_staged
+    ids = seed_applicants(fake, 20)
+    model = FakeGeminiModel(quota_error_rate=0.5)
+    monkeypatch.setattr(llm, 'gemini_model', model)
+    results = run_staged(ids, workers={'llm': 4}, requests_per_minute=60000)
+    assert not any(results.values())
+    assert model.calls == 20
+    assert not any(run_staged(ids, workers={'llm': 4}, requests_per_minute=60000).values())
+    assert model.calls == 20
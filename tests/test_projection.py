@@ -0,0 +1,39 @@
+import json
+
+from projection import estimate_tokens, project_for_llm
+
+
+def _payload(jobs):
+    return {
+        'version': '2.0.0',
+        'applicant_id': 'rec1',
+        'personal': {'Full Name': 'Ada', 'Email': 'ada@example.com', 'Location': 'Berlin, Germany',
+                     'Applicant ID': ['rec1']},
+        'experience': [{'Company': f'Co{i}', 'Title': 'Engineer', 'Start': f'{2000 + i}-03-01T00:00:00.000Z',
+                        'End': f'{2001 + i}-02-01', 'Description': 'x' * 1000, 'Applicant ID': ['rec1']}
+                       for i in range(jobs)],
+        'salary': {'Preferred Rate': 100, 'Minimum Rate': '80', 'Currency': 'EUR', 'Availability': '20 hrs/week'},
+        'meta': {'compressed_at': '2024-01-01T00:00:00+00:00', 'compressor_version': 'v1'},
+    }
+
+
+def test_keeps_prompt_fields_in_short_form():
+    projection = project_for_llm(_payload(1))
+    data = json.loads(projection.payload_json)
+    assert data == {
+        'applicant_id': 'rec1', 'name': 'Ada', 'location': 'Berlin, Germany',
+        'rate': 'EUR 80-100/h', 'availability': '20h/wk',
+        'experience': [{'company': 'Co0', 'title': 'Engineer', 'description': 'x' * 297 + '...',
+                        'dates': '2000-03..2001-02'}],
+    }
+    assert projection.tokens == estimate_tokens(projection.payload_json)
+    assert projection.summarized_jobs == 0
+
+
+def test_long_history_is_summarized_to_fit_budget():
+    projection = project_for_llm(_payload(30), token_budget=400)
+    data = json.loads(projection.payload_json)
+    assert projection.tokens <= 400
+    assert data['experience'][0]['company'] == 'Co29'
+    assert len(data['experience']) + projection.summarized_jobs == 30
+    assert data['earlier_roles'].startswith(f'{projection.summarized_jobs} earlier roles since 2000 at Co')
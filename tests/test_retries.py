@@ -0,0 +1,107 @@
+import pytest
+import requests
+
+import airtable_utils
+import retries
+from fakes import FakeAirtable, ResourceExhausted, rate_limited_error
+from llm import MalformedResponseError
+from retries import CircuitBreaker, CircuitOpenError, is_transient, retry_after
+
+
+def _http_error(status, **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return requests.exceptions.HTTPError(f'{status} error', response=response)
+
+
+def test_transient_and_permanent_errors():
+    assert is_transient(rate_limited_error())
+    assert is_transient(_http_error(503))
+    assert is_transient(ResourceExhausted('quota'))
+    assert is_transient(requests.exceptions.ReadTimeout())
+    assert not is_transient(_http_error(401))
+    assert not is_transient(_http_error(422))
+    assert not is_transient(ValueError('API key not valid'))
+    assert not is_transient(MalformedResponseError('no Summary'))
+
+
+def test_retry_after_header():
+    assert retry_after(_http_error(429, **{'Retry-After': '7'})) == 7.0
+    assert retry_after(_http_error(429, **{'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0.0
+    assert retry_after(_http_error(429)) is None
+
+
+def test_call_retries_only_transient_errors(monkeypatch):
+    waits = []
+    monkeypatch.setattr(retries, 'sleep', waits.append)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _http_error(429, **{'Retry-After': '2'})
+        return 'ok'
+
+    assert retries.call('test', flaky) == 'ok'
+    assert waits == [2.0, 2.0]
+
+    def broken():
+        calls.append(1)
+        raise _http_error(401)
+
+    calls.clear()
+    with pytest.raises(requests.exceptions.HTTPError):
+        retries.call('test', broken)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    cb = CircuitBreaker('test', failure_threshold=2, reset_seconds=0)
+    cb.before_call()
+    cb.record_failure()
+    cb.record_failure()
+    assert cb.state == 'half-open'
+    cb.before_call()  # the trial call
+    with pytest.raises(CircuitOpenError):
+        cb.before_call()
+    cb.record_success()
+    assert cb.state == 'closed'
+
+    cb = CircuitBreaker('test', failure_threshold=2, reset_seconds=60)
+    cb.record_failure()
+    cb.record_failure()
+    with pytest.raises(CircuitOpenError) as err:
+        cb.before_call()
+    assert err.value.backend == 'test' and err.value.retry_in > 50
+
+
+def test_airtable_calls_survive_rate_limiting():
+    fake = FakeAirtable(error_rate=0.3, seed=1)
+    fake.table('applicants').seed({'Applicant ID': f'A{i}'} for i in range(250))
+    with fake.installed():
+        assert len(airtable_utils.fetch_all_records('applicants')) == 250
+        with airtable_utils.write_buffer():
+            for i in range(30):
+                airtable_utils.create_record('shortlisted', {'Score Reason': str(i)})
+    assert fake.rate_limited > 0
+    # retried chunks are not written twice
+    assert len(fake.table('shortlisted').records) == 30
+
+
+def test_llm_fields_write_is_retried():
+    import llm
+    fake = FakeAirtable()
+    rec = fake.table('applicants').seed([{'Applicant ID': 'A1'}])[0]
+    original = fake._request
+    failures = iter([True, False])
+
+    def flaky(table_name, op):
+        if op == 'update' and next(failures, False):
+            raise rate_limited_error()
+        original(table_name, op)
+
+    fake._request = flaky
+    with fake.installed():
+        llm.update_airtable(rec['id'], {'summary': 'ok', 'score': 7, 'follow_ups': '* one'})
+    assert fake.table('applicants').records[rec['id']]['fields']['LLM Score'] == 7
@@ -0,0 +1,36 @@
+from rules import evaluate_batch, load_rules
+
+
+def _payload(aid, experience, rate, availability, location):
+    return {
+        'applicant_id': aid,
+        'experience': experience,
+        'salary': {'Preferred Rate': rate, 'Availability': availability},
+        'personal': {'Location': location},
+    }
+
+
+def test_batch_verdicts_and_reasons():
+    payloads = [
+        _payload('rec1', [{'Company': 'Stanbic', 'Start': '2015-01-01', 'End': '2020-01-01'}], 80, '30 hrs/week', 'Toronto, Canada'),
+        _payload('rec2', [{'Company': 'Google', 'Start': '2023-01-01', 'End': '2024-01-01'}], 90, '20', 'Berlin, Germany'),
+        _payload('rec3', [{'Company': 'Acme', 'Start': 'n/a'}], 50, '40', 'Nairobi, Kenya'),
+        _payload('rec4', [], None, None, ''),
+    ]
+    verdicts = evaluate_batch(payloads, load_rules({}))
+    assert [v.applicant_id for v in verdicts] == ['rec1', 'rec2', 'rec3', 'rec4']
+    assert [v.ok for v in verdicts] == [True, True, False, False]
+    assert verdicts[0].reason == 'exp:5, tier1:False, pref:80, avail:30, location_ok:True'
+    assert verdicts[1].reason == 'exp:1, tier1:True, pref:90, avail:20, location_ok:True'
+    assert verdicts[3].reason == 'exp:0, tier1:False, pref:99999, avail:0, location_ok:False'
+
+
+def test_thresholds_come_from_config():
+    payload = _payload('rec1', [{'Company': 'Acme', 'Start': '2018', 'End': '2020'}], 120, '25', 'India')
+    assert not evaluate_batch([payload], load_rules({}))[0].ok
+    relaxed = load_rules({'shortlist': {'min_years_experience': 2, 'max_preferred_rate': 150}})
+    assert evaluate_batch([payload], relaxed)[0].ok
+
+
+def test_configured_rules_are_compiled_once():
+    assert load_rules() is load_rules()
@@ -0,0 +1,25 @@
+from fakes import FakeAirtable, seed_applicants
+from rules import load_rules
+from snapshot import Snapshot, export_snapshot, replay
+
+
+def test_export_then_replay_without_api_calls(tmp_path):
+    fake = FakeAirtable()
+    with fake.installed():
+        ids = seed_applicants(fake, 30)
+        counts = export_snapshot(str(tmp_path))
+        assert counts['applicants'] == 30 and counts['shortlisted'] == 0
+        fake.reset_counts()
+        snap = Snapshot(str(tmp_path))
+        assert snap.get('applicants', ids[3])['fields']['Applicant ID'] == ids[3]
+        assert snap.get('applicants', 'recMissing') is None
+        strict = replay(snap, rules=load_rules({'shortlist': {'allowed_locations': []}}))
+        loose = replay(snap, rules=load_rules({'shortlist': {'min_years_experience': 0, 'max_preferred_rate': 1000,
+                                                             'min_availability_hours': 0, 'tier1_companies': ['Acme'],
+                                                             'allowed_locations': ['Canada', 'Germany', 'Kenya',
+                                                                                   'United States', 'India']}}))
+        snap.close()
+    assert sum(fake.calls.values()) == 0
+    assert strict['applicants'] == loose['applicants'] == 30
+    assert strict['shortlisted'] == 0 and loose['shortlisted'] > 0
+    assert strict['writes_skipped'] > 0
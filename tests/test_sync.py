@@ -0,0 +1,42 @@
+import sync
+
+
+def test_incremental_run_uses_watermark_and_carries_failures(monkeypatch, tmp_path):
+    path = str(tmp_path / 'wm.json')
+    calls = []
+
+    def run_batch(ids=None):
+        calls.append(ids)
+        return {'rec1': None, 'rec2': 'boom'} if ids is None else {aid: None for aid in ids}
+
+    sync.run_incremental(run_batch, path=path)
+    assert calls == [None]
+    state = sync.load_watermark(path)
+    assert state['since'] and state['pending'] == ['rec2']
+
+    seen_since = []
+    monkeypatch.setattr(sync, 'changed_applicant_ids', lambda since: seen_since.append(since) or {'rec3'})
+    sync.run_incremental(run_batch, path=path)
+    assert seen_since == [state['since']]
+    assert calls[-1] == ['rec2', 'rec3']
+    assert sync.load_watermark(path)['pending'] == []
+
+
+def test_changed_ids_map_child_rows_to_applicants(monkeypatch):
+    rows = {
+        'applicants': [{'id': 'recA', 'fields': {'Applicant ID': 'recA'}}],
+        'personal': [],
+        'work': [{'id': 'w1', 'fields': {'Applicant ID': ['recB']}}, {'id': 'w2', 'fields': {'Applicant ID': ['recB']}}],
+        'salary': [{'id': 's1', 'fields': {'Applicant ID': ['recC']}}],
+    }
+    formulas = {}
+    monkeypatch.setattr(sync, 'fetch_all_records', lambda key, formula=None: formulas.setdefault(key, formula) and rows[key])
+    looked_up = []
+    applicants = {'recB': {'id': 'recB', 'fields': {'Applicant ID': 'APP-B'}},
+                  'recC': {'id': 'recC', 'fields': {'Applicant ID': 'APP-C'}}}
+    monkeypatch.setattr(sync, 'get_records', lambda key, ids, fields=None: looked_up.append(set(ids)) or applicants)
+    # linked record ids are reported as Applicant ID values, in one bulk lookup
+    assert sync.changed_applicant_ids('2024-01-01T00:00:00+00:00') == {'recA', 'APP-B', 'APP-C'}
+    assert looked_up == [{'recB', 'recC'}]
+    assert 'CREATED_TIME()' in formulas['applicants']
+    assert 'LAST_MODIFIED_TIME()' in formulas['work']
@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fakes import FakeAirtable, seed_applicants
+from jobqueue import PENDING, JobQueue
+from webhook import WebhookReceiver, changes_from_payload, make_server
+
+TABLE_KEYS = {'tblApp': 'applicants', 'tblPer': 'personal', 'tblWork': 'work', 'tblSal': 'salary',
+              'tblShort': 'shortlisted'}
+FIELD_NAMES = {'fldScore': 'LLM Score', 'fldCo': 'Company', 'fldLoc': 'Location'}
+
+
+def _payload(table_id, record_id, fields, created=False):
+    cells = {f: 'x' for f in fields}
+    change = ({'createdRecordsById': {record_id: {'cellValuesByFieldId': cells}}} if created
+              else {'changedRecordsById': {record_id: {'current': {'cellValuesByFieldId': cells}}}})
+    return {'payloadFormat': 'v0', 'changedTablesById': {table_id: change}}
+
+
+class FakePayloads:
+    """Stands in for the Airtable payloads endpoint: fetch returns what was queued since the last commit."""
+    def __init__(self):
+        self.pending = []
+
+    def fetch(self, webhook_id):
+        return list(self.pending), len(self.pending)
+
+    def commit(self, webhook_id, cursor):
+        del self.pending[:cursor]
+
+
+def test_changes_from_payload():
+    payload = _payload('tblWork', 'recW', ['fldCo'])
+    payload['changedTablesById']['tblOther'] = {'destroyedRecordIds': ['recX']}
+    assert changes_from_payload(payload, TABLE_KEYS, FIELD_NAMES) == [('work', 'recW', {'Company'}, False)]
+
+
+@pytest.fixture
+def served(tmp_path):
+    fake = FakeAirtable()
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    source = FakePayloads()
+    secret = base64.b64encode(b'shh').decode()
+    receiver = WebhookReceiver(queue, source, TABLE_KEYS, FIELD_NAMES, debounce=60, max_wait=600)
+    server = make_server(receiver, host='127.0.0.1', port=0, mac_secret=secret)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    with fake.installed():
+        thread.start()
+        yield fake, queue, source, server, secret
+        server.shutdown()
+        server.server_close()
+
+
+def _ping(server, secret, body=None):
+    data = json.dumps(body or {'base': {'id': 'appTest'}, 'webhook': {'id': 'achHook'}}).encode()
+    mac = 'hmac-sha256=' + hmac.new(base64.b64decode(secret), data, hashlib.sha256).hexdigest()
+    req = urllib.request.Request(f'http://127.0.0.1:{server.server_address[1]}/', data=data,
+                                 headers={'Content-Type': 'application/json', 'X-Airtable-Content-MAC': mac})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def test_burst_of_child_edits_becomes_one_debounced_job(served):
+    fake, queue, source, server, secret = served
+    aid, other = seed_applicants(fake, 2, seed=3)
+    child = {key: [r for r in fake.table(key).records.values() if r['fields']['Applicant ID'] == [aid]]
+             for key in ('personal', 'work', 'salary')}
+
+    source.pending = [_payload('tblPer', child['personal'][0]['id'], ['fldLoc'])]
+    assert _ping(server, secret) == {'enqueued': [aid]}
+    first = queue.get(1)['available_at']
+    time.sleep(0.01)
+    source.pending = [_payload('tblWork', w['id'], ['fldCo'], created=True) for w in child['work']]
+    source.pending.append(_payload('tblSal', child['salary'][0]['id'], ['fldLoc']))
+    # the pipeline's own writes to Applicants must not trigger runs
+    source.pending.append(_payload('tblApp', other, ['fldScore']))
+    assert _ping(server, secret) == {'enqueued': [aid]}
+
+    assert queue.counts()[PENDING] == 1
+    job = queue.get(1)
+    assert job['applicant_id'] == aid
+    assert first < job['available_at'] <= job['enqueued_at'] + 600
+    assert queue.claim('w1') is None  # still inside the debounce window
+
+
+def test_rejects_bad_signature(served):
+    _, queue, _, server, _ = served
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _ping(server, base64.b64encode(b'wrong').decode())
+    assert err.value.code == 401
+    assert queue.counts()[PENDING] == 0
+
+
+def test_failed_lookup_leaves_payloads_for_the_next_ping(served):
+    fake, queue, source, server, secret = served
+    aid = seed_applicants(fake, 1)[0]
+    work = next(r for r in fake.table('work').records.values() if r['fields']['Applicant ID'] == [aid])
+    source.pending = [_payload('tblWork', work['id'], ['fldCo'])]
+    fake.error_rate = 1.0
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _ping(server, secret)
+    assert err.value.code == 500
+    assert queue.counts()[PENDING] == 0 and len(source.pending) == 1
+    fake.error_rate = 0.0
+    assert _ping(server, secret) == {'enqueued': [aid]}
+    assert source.pending == []
+
+
+def test_refuses_to_start_unsigned_unless_allowed(tmp_path):
+    receiver = WebhookReceiver(JobQueue(str(tmp_path / 'jobs.sqlite3')), FakePayloads(), TABLE_KEYS, FIELD_NAMES)
+    with pytest.raises(ValueError):
+        make_server(receiver, host='127.0.0.1', port=0, mac_secret='', allow_unsigned=False)
+    make_server(receiver, host='127.0.0.1', port=0, mac_secret='', allow_unsigned=True).server_close()
+
+
+def test_invalid_secret_rejects_instead_of_crashing(tmp_path):
+    receiver = WebhookReceiver(JobQueue(str(tmp_path / 'jobs.sqlite3')), FakePayloads(), TABLE_KEYS, FIELD_NAMES)
+    server = make_server(receiver, host='127.0.0.1', port=0, mac_secret='not base64!')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as err:
+            _ping(server, base64.b64encode(b'shh').decode())
+        assert err.value.code == 401
+    finally:
+        server.shutdown()
+        server.server_close()